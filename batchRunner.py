@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Headless command line runner to solve models saved as JSON files without the
+graphical user interface. Neither PyQt5 nor matplotlib is imported, so it can
+be used on compute nodes and in scripted pipelines, e.g.
+
+    >>python batchRunner.py jsons/default.json jsons/b_small.json --study b
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from dataTypes import InputData, OutputData
+from meshCache import MeshCache
+from solvers import MESH_CACHE, Solver
+
+def parseArguments(argv=None):
+    """
+    Function to parse the command line arguments.
+
+    Parameters
+    ----------
+    TYPE(argv): : list, optional
+        DESCRIPTION. The arguments, the default is None (sys.argv).
+
+    Returns
+    -------
+    TYPE(args): : argparse.Namespace
+        DESCRIPTION. The parsed arguments.
+
+    """
+    parser = argparse.ArgumentParser(
+        description="Solve wall bar models saved as JSON files without the "
+                    "graphical user interface.")
+    parser.add_argument("models", nargs="+",
+                        help="JSON model files, saved by the program.")
+    parser.add_argument("-o", "--output-dir", default="results",
+                        help="Directory for the results, one subdirectory "
+                             "per model (default: results).")
+    parser.add_argument("--study", choices=["none", "b", "q"], default="none",
+                        help="Parameter study to perform after the solve, "
+                             "from b to bend or q to qend (default: none).")
+    parser.add_argument("--steps", type=int, default=None,
+                        help="Number of parameter study steps (default: "
+                             "paramSteps of the model).")
+    parser.add_argument("--vtk-format", choices=["vtk", "vtu", "xdmf"],
+                        default="vtu",
+                        help="Format of the exported results "
+                             "(default: vtu).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes for a study on b "
+                             "(default: 1).")
+    parser.add_argument("--mesh-cache", default=None,
+                        help="Directory of an on-disk mesh cache.")
+    parser.add_argument("--solver", choices=["auto", "dense", "superlu",
+                                             "cholmod", "pcg"],
+                        default=None,
+                        help="Linear solver backend (default: solver of the "
+                             "model, auto if not set).")
+    parser.add_argument("--corner-el-size", type=float, default=None,
+                        help="Element size at the notch corners relative to "
+                             "el_size_factor (default: that of the model).")
+    parser.add_argument("--grading", type=float, default=None,
+                        help="Size ratio of neighbouring elements away from "
+                             "the notch corners (default: that of the "
+                             "model).")
+    parser.add_argument("--symmetric", action="store_true",
+                        help="Solve the lower half of the bar and mirror the "
+                             "results, the bar is symmetric about y = h/2 "
+                             "(default: that of the model).")
+    parser.add_argument("--rtol", type=float, default=1e-10,
+                        help="Relative residual of the pcg solver, a b study "
+                             "starts each step from the previous one "
+                             "(default: 1e-10).")
+    parser.add_argument("--adaptive", type=float, default=None,
+                        metavar="TOL",
+                        help="Refine the mesh until the estimated relative "
+                             "error in energy norm is below TOL, e.g. 0.05.")
+    parser.add_argument("--adaptive-steps", type=int, default=5,
+                        help="Largest number of remeshes of an adaptive "
+                             "solve (default: 5).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record the time, peak memory and problem size "
+                             "of every solver stage to the summary.")
+    parser.add_argument("--archive", choices=["none", "npz", "mat", "mmap"],
+                        default="none",
+                        help="Save all results of the solve to one archive, "
+                             "mmap is an uncompressed .npz that can be "
+                             "memory-mapped (default: none).")
+
+    args = parser.parse_args(argv)
+
+    if args.corner_el_size is not None and not 0 < args.corner_el_size <= 1:
+        parser.error("--corner-el-size must be in (0, 1].")
+    if args.grading is not None and not args.grading > 1:
+        parser.error("--grading must be above 1.")
+
+    return args
+
+def runModel(filename, args):
+    """
+    Function to solve one model and write its results. The solution is
+    exported to the model's result directory together with a JSON summary,
+    followed by the parameter study if one is requested.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. The JSON model file.
+    TYPE(args): : argparse.Namespace
+        DESCRIPTION. The parsed command line arguments.
+
+    Returns
+    -------
+    TYPE(summary): : dict
+        DESCRIPTION. Problem size and key results of the model.
+
+    """
+    input_data = InputData()
+    input_data.load(filename)
+
+    #A study starts from the loaded values, as when started from the GUI.
+    input_data.bstart = input_data.b
+    input_data.qstart = input_data.q
+    input_data.paramb = args.study == "b"
+    input_data.paramq = args.study == "q"
+    input_data.paramSteps = int(args.steps or input_data.paramSteps)
+    if args.solver is not None:
+        input_data.solver = args.solver
+    if args.corner_el_size is not None:
+        input_data.corner_el_size = args.corner_el_size
+    if args.grading is not None:
+        input_data.grading = args.grading
+    if args.symmetric:
+        input_data.symmetric = True
+    input_data.checkRefinement()
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    directory = os.path.join(args.output_dir, name)
+    os.makedirs(directory, exist_ok=True)
+
+    #The shared in-memory cache lets a parameter study reuse the mesh.
+    mesh_cache = MESH_CACHE
+    if args.mesh_cache is not None:
+        mesh_cache = MeshCache(args.mesh_cache)
+
+    output_data = OutputData()
+    solver = Solver(input_data, output_data, workers=args.workers,
+                    vtk_format=args.vtk_format, mesh_cache=mesh_cache,
+                    vtk_dir=directory, rtol=args.rtol,
+                    profile=args.profile, adaptive_tol=args.adaptive,
+                    adaptive_steps=args.adaptive_steps)
+
+    solver.execute()
+
+    extension = ".vtk" if args.vtk_format == "vtk" else ".vtu"
+    solver.exportVtk(os.path.join(directory, name + extension))
+
+    summary = {"model": filename,
+               "ndof": int(np.size(output_data.dofs)),
+               "nel": int(output_data.edof.shape[0]),
+               "max_mises": float(output_data.maxEssef),
+               "max_displacement": float(np.max(np.abs(output_data.a))),
+               "max_reaction": float(np.max(np.abs(output_data.r))),
+               "solver": output_data.backend,
+               "solve_time": output_data.solveTime,
+               "residual": output_data.residual,
+               "iterations": output_data.iterations,
+               "error_estimate": output_data.errorEstimate,
+               "adaptations": output_data.adaptations}
+
+    if args.profile:
+        summary["profile"] = [dict(zip(record.dtype.names, record.tolist()))
+                              for record in output_data.profile]
+
+    with open(os.path.join(directory, name + "_summary.json"), "w") as ofile:
+        json.dump(summary, ofile, sort_keys = True, indent = 4)
+
+    if args.archive != "none":
+        extension = ".mat" if args.archive == "mat" else ".npz"
+        output_data.save(os.path.join(directory, name + "_results" + extension),
+                         compress = args.archive != "mmap")
+
+    if input_data.paramb or input_data.paramq:
+        solver.executeParamStudy()
+
+    return summary
+
+def main(argv=None):
+    """
+    Function to run all models given on the command line. A failing model is
+    reported and the remaining models are still run.
+
+    Parameters
+    ----------
+    TYPE(argv): : list, optional
+        DESCRIPTION. The arguments, the default is None (sys.argv).
+
+    Returns
+    -------
+    TYPE(status): : int
+        DESCRIPTION. Exit status, 1 if any model failed, else 0.
+
+    """
+    args = parseArguments(argv)
+    status = 0
+
+    for filename in args.models:
+        try:
+            summary = runModel(filename, args)
+        except Exception as err:
+            print(f"{filename}: failed, {err}", file=sys.stderr)
+            status = 1
+            continue
+
+        print(f"{filename}: ndof = {summary['ndof']}, nel = {summary['nel']}, "
+              f"max von Mises = {summary['max_mises']:.4e} Pa, "
+              f"{summary['solver']} solve {summary['solve_time']:.3f} s")
+
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
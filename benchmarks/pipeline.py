@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Times each stage of the solver pipeline for the saved models over a range of
+element sizes and both element types, without the graphical user interface.
+The results are written to a JSON file, and compared stage by stage to an
+earlier run if one is given, e.g.
+
+    >>python benchmarks/pipeline.py --output new.json --baseline old.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from dataTypes import InputData, OutputData
+from solvers import Solver
+
+#Stages of the pipeline in the order they are run, as named by Solver.stage.
+STAGES = ("geometry", "mesh", "model", "load", "assembly", "solve",
+          "stresses", "postprocess", "export", "export mat")
+
+#Element sizes and types swept by default.
+EL_SIZE_FACTORS = (0.1, 0.05, 0.025)
+EL_TYPES = (2, 3)
+
+def runPipeline(input_data, directory, vtk_format="vtu"):
+    """
+    Function to solve a model once and time its stages. The solver is run as
+    by the user interface, and the stages are timed by its stage hook.
+    Nothing is cached, so the model is meshed by GMSH on every run.
+
+    Parameters
+    ----------
+    TYPE(input_data): : dataTypes.InputData
+        DESCRIPTION. The model to solve.
+    TYPE(directory): : str
+        DESCRIPTION. Directory for the exported files.
+    TYPE(vtk_format): : str, optional
+        DESCRIPTION. Format of the VTK export. The default is "vtu".
+
+    Returns
+    -------
+    TYPE(times): : dict
+        DESCRIPTION. Time in seconds of each stage, summed if a stage is run
+        more than once, e.g. by an adaptive solve.
+    TYPE(size): : dict
+        DESCRIPTION. Problem size and solver of the run.
+
+    """
+    times = {}
+
+    def record(stage):
+        times[stage["stage"]] = times.get(stage["stage"], 0.0) + stage["time"]
+
+    output_data = OutputData()
+    solver = Solver(input_data, output_data, mesh_cache=None,
+                    vtk_format=vtk_format, vtk_dir=directory,
+                    stage_hook=record)
+
+    solver.execute()
+
+    extension = ".vtk" if vtk_format == "vtk" else ".vtu"
+    solver.exportVtk(os.path.join(directory, "benchmark" + extension))
+    with solver.stage("export mat"):
+        output_data.save(os.path.join(directory, "benchmark.mat"))
+
+    size = {"ndof": int(solver.ndof), "nel": int(solver.edof.shape[0]),
+            "nfree": int(solver.partition.nfree),
+            "backend": output_data.backend,
+            "iterations": int(output_data.iterations)}
+
+    return times, size
+
+def benchmarkCase(filename, el_size_factor, el_type, repeat=3, warmup=1,
+                  vtk_format="vtu"):
+    """
+    Function to benchmark one model for one element size and type. The
+    warm-up runs are not timed, so lazy imports and first calls of the
+    libraries don't count towards the first case.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. The JSON model file.
+    TYPE(el_size_factor): : float
+        DESCRIPTION. Element size factor of the mesh.
+    TYPE(el_type): : int
+        DESCRIPTION. Element type, 2: triangles, 3: quads.
+    TYPE(repeat): : int, optional
+        DESCRIPTION. Number of timed runs. The default is 3.
+    TYPE(warmup): : int, optional
+        DESCRIPTION. Number of runs before the timed runs. The default is 1.
+    TYPE(vtk_format): : str, optional
+        DESCRIPTION. Format of the VTK export. The default is "vtu".
+
+    Returns
+    -------
+    TYPE(result): : dict
+        DESCRIPTION. Median and minimum time of each stage run and the
+        total, the problem size, or the error if the model failed.
+
+    """
+    input_data = InputData()
+    input_data.load(filename)
+    input_data.el_size_factor = el_size_factor
+    input_data.el_type = el_type
+
+    result = {"model": os.path.basename(filename),
+              "el_size_factor": el_size_factor, "el_type": el_type}
+    runs = []
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(warmup):
+                runPipeline(input_data, directory, vtk_format)
+            for _ in range(repeat):
+                times, size = runPipeline(input_data, directory, vtk_format)
+                times["total"] = sum(times.values())
+                runs.append(times)
+    except Exception as err:
+        result["error"] = f"{type(err).__name__}: {err}"
+        return result
+
+    #Stages of the solver options, e.g. "mirror" of a half model, are kept.
+    stages = list(dict.fromkeys(stage for run in runs for stage in run))
+
+    result.update(size)
+    result["median"] = {stage: statistics.median(run.get(stage, 0.0)
+                                                 for run in runs)
+                        for stage in stages}
+    result["min"] = {stage: min(run.get(stage, 0.0) for run in runs)
+                     for stage in stages}
+
+    return result
+
+def caseKey(result):
+    """
+    Function to get the key identifying the case of a result.
+
+    """
+    return (result["model"], result["el_size_factor"], result["el_type"])
+
+def compare(results, baseline):
+    """
+    Function to make the relative change of the median stage times from a
+    baseline run.
+
+    Parameters
+    ----------
+    TYPE(results): : list
+        DESCRIPTION. Results of this run.
+    TYPE(baseline): : list
+        DESCRIPTION. Results of the baseline run.
+
+    Returns
+    -------
+    TYPE(deltas): : list
+        DESCRIPTION. For each case in both runs the model, element size,
+        element type and relative change of every stage, e.g. 0.1 if 10 %
+        slower.
+
+    """
+    previous = {caseKey(result): result for result in baseline
+                if "error" not in result}
+    deltas = []
+
+    for result in results:
+        old = previous.get(caseKey(result))
+        if old is None or "error" in result:
+            continue
+
+        change = {stage: (result["median"][stage] - old["median"][stage])
+                         / old["median"][stage]
+                  for stage in result["median"]
+                  if old["median"].get(stage, 0.0) > 0.0}
+
+        deltas.append({"model": result["model"],
+                       "el_size_factor": result["el_size_factor"],
+                       "el_type": result["el_type"], "change": change})
+
+    return deltas
+
+def printResults(results, deltas=None):
+    """
+    Function to print the median stage times in milliseconds, followed by
+    the change from the baseline if one is given.
+
+    """
+    header = f"{'model':18s} {'size':>6s} {'type':>4s} {'ndof':>7s} " + \
+             " ".join(f"{stage:>11s}" for stage in STAGES + ("total",))
+    print(header)
+
+    for result in results:
+        case = (f"{result['model']:18s} {result['el_size_factor']:6g} "
+                f"{result['el_type']:4d}")
+        if "error" in result:
+            print(f"{case} failed: {result['error']}")
+            continue
+        print(f"{case} {result['ndof']:7d} " +
+              " ".join(f"{result['median'].get(stage, 0.0)*1000:11.2f}"
+                       for stage in STAGES + ("total",)))
+
+    if not deltas:
+        return
+
+    print("\nChange from baseline")
+    print(header)
+    for delta in deltas:
+        print(f"{delta['model']:18s} {delta['el_size_factor']:6g} "
+              f"{delta['el_type']:4d} {'':7s} " +
+              " ".join(f"{delta['change'][stage]*100:+10.1f}%"
+                       if stage in delta["change"] else f"{'-':>11s}"
+                       for stage in STAGES + ("total",)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the stages of the solver pipeline over element "
+                    "sizes and types.")
+    parser.add_argument("models", nargs="*",
+                        default=sorted(glob.glob(os.path.join(ROOT, "jsons",
+                                                              "*.json"))),
+                        help="JSON model files (default: all in jsons/).")
+    parser.add_argument("--el-size-factors", type=float, nargs="+",
+                        default=list(EL_SIZE_FACTORS),
+                        help="Element size factors to sweep (default: "
+                             f"{' '.join(str(f) for f in EL_SIZE_FACTORS)}).")
+    parser.add_argument("--el-types", type=int, nargs="+", choices=EL_TYPES,
+                        default=list(EL_TYPES),
+                        help="Element types to sweep, 2: triangles, 3: quads "
+                             "(default: both).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs per case (default: 3).")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="Number of untimed runs before the timed runs "
+                             "of a case (default: 1).")
+    parser.add_argument("--vtk-format", choices=["vtk", "vtu"],
+                        default="vtu",
+                        help="Format of the VTK export (default: vtu).")
+    parser.add_argument("-o", "--output", default="benchmark_pipeline.json",
+                        help="JSON file for the results "
+                             "(default: benchmark_pipeline.json).")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON file of an earlier run to compare with.")
+    args = parser.parse_args(argv)
+
+    results = []
+    for filename in args.models:
+        for el_type in args.el_types:
+            for el_size_factor in args.el_size_factors:
+                results.append(benchmarkCase(filename, el_size_factor,
+                                             el_type, args.repeat,
+                                             args.warmup, args.vtk_format))
+
+    deltas = None
+    if args.baseline is not None:
+        with open(args.baseline, "r") as ifile:
+            deltas = compare(results, json.load(ifile)["results"])
+
+    report = {"date": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "platform": platform.platform(),
+              "repeat": args.repeat,
+              "warmup": args.warmup,
+              "stages": list(STAGES),
+              "results": results}
+    if deltas is not None:
+        report["baseline"] = args.baseline
+        report["change"] = deltas
+
+    with open(args.output, "w") as ofile:
+        json.dump(report, ofile, indent=4)
+
+    printResults(results, deltas)
+
+    return int(any("error" in result for result in results))
+
+if __name__ == "__main__":
+    sys.exit(main())
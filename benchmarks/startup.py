@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the import time of the program's modules, each in a fresh
+interpreter, and lists which of the heavy dependencies they load, e.g.
+
+    >>python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+#Modules of the program to time.
+MODULES = ("userInterface", "solvers", "batchRunner", "resultUtilities")
+
+#Dependencies that are slow to import and should only load when used.
+HEAVY_MODULES = ("PyQt5.QtWidgets", "matplotlib", "calfem.vis_mpl",
+                 "calfem.mesh", "gmsh", "pyvtk", "scipy.io", "tabulate")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Run in the child interpreter, prints the import time and loaded modules.
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"time": elapsed,
+                  "loaded": [name for name in {heavy!r}
+                             if name in sys.modules]}}))
+"""
+
+def measure(module, repeat=3):
+    """
+    Function to measure the import time of a module.
+
+    Parameters
+    ----------
+    TYPE(module): : str
+        DESCRIPTION. Name of the module to import.
+    TYPE(repeat): : int, optional
+        DESCRIPTION. Number of fresh interpreters to time. The default is 3.
+
+    Returns
+    -------
+    TYPE(result): : dict
+        DESCRIPTION. Median and minimum time in seconds and the heavy
+        modules loaded, or the error if the import failed.
+
+    """
+    script = SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    times = []
+
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-c", script], cwd=ROOT,
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            return {"module": module, "error": error[-1] if error else ""}
+
+        data = json.loads(process.stdout.strip().splitlines()[-1])
+        times.append(data["time"])
+
+    return {"module": module, "median": statistics.median(times),
+            "min": min(times), "loaded": data["loaded"]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the program's modules.")
+    parser.add_argument("modules", nargs="*", default=list(MODULES),
+                        help="Modules to time (default: all).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of fresh interpreters per module "
+                             "(default: 3).")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    results = [measure(module, args.repeat) for module in args.modules]
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return 0
+
+    for result in results:
+        if "error" in result:
+            print(f"{result['module']:16s} failed: {result['error']}")
+            continue
+        loaded = ", ".join(result["loaded"]) or "-"
+        print(f"{result['module']:16s} {result['median']*1000:8.1f} ms  "
+              f"heavy: {loaded}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,13 @@ Created on Fri Apr  5 15:42:47 2020
 @author: Pontus Nordqvist
 @email: p.nordq@gmail.com
 """
+import hashlib
 import json
+import os
+import struct
+import zipfile
+
+import numpy as np
 import calfem.geometry as cfg
 
 class InputData():
@@ -13,6 +19,17 @@ class InputData():
     Class to define input data for our model.
     """
 
+    #Fields that decide the results of a solve.
+    RESULT_FIELDS = ("h", "w", "a", "b", "el_size_factor", "el_type",
+                     "corner_el_size", "grading", "symmetric", "t", "E", "v",
+                     "q")
+
+    #Outline points at the re-entrant notch corners, (w-+a)/2 at b and h-b.
+    NOTCH_CORNERS = (2, 3, 8, 9)
+
+    #Border marker of the symmetry line y = h/2 of a half model.
+    SYMMETRY_MARKER = 18
+
     def __init__(self):
         """
         Cunstructor with initialize with default values.
@@ -32,6 +49,15 @@ class InputData():
 
         self.el_size_factor = 0.5 #Gives the area of the elements.
 
+        #--Element size at the notch corners relative to el_size_factor, and
+        #--size ratio of neighbouring elements it grows back with.
+        self.corner_el_size = 1.0
+        self.grading = 1.3
+
+        #Boolean to solve the lower half of the bar, which is symmetric
+        #about y = h/2, and mirror the results.
+        self.symmetric = False
+
         #--Default forces and material properties.
         self.E = 2.08e10
         self.v = 0.2
@@ -53,11 +79,43 @@ class InputData():
 
         self.el_type = 2 #Element typ, 2: triangles, 3: quads.
 
+        #Linear solver backend, see solvers.ReducedSystem.BACKENDS.
+        self.solver = "auto"
 
-    def geometry(self):
+
+    def checkRefinement(self):
+        """
+        Method to check the element size at the notch corners. A corner size
+        below the global size needs a grading above 1 to grow back with.
+
+        Raises
+        ------
+        ValueError
+            If corner_el_size is not in (0, 1] or grading is not above 1.
+
+        Returns
+        -------
+        None.
+
+        """
+        if not 0 < self.corner_el_size <= 1:
+            raise ValueError("corner_el_size must be in (0, 1], got "
+                             f"{self.corner_el_size}.")
+        if self.corner_el_size < 1 and not self.grading > 1:
+            raise ValueError("grading must be above 1 to refine the notch "
+                             f"corners, got {self.grading}.")
+
+    def geometry(self, half=None):
         """
         Method which defines a geometry to be used by the GMSH mesh generator.
 
+        Parameters
+        ----------
+        TYPE(half): : bool, optional
+            DESCRIPTION. Boolean to only define the lower half of the bar,
+            with the symmetry line y = h/2 marked by SYMMETRY_MARKER. The
+            default is None (half if the model is symmetric).
+
         Returns
         -------
         TYPE(g): : calfem.geometry.Geometry
@@ -65,6 +123,8 @@ class InputData():
 
         """
 
+        self.checkRefinement()
+
         g = cfg.Geometry()
 
         h = self.h
@@ -72,33 +132,94 @@ class InputData():
         a = self.a
         b = self.b
 
+        #The boundarys corner points in order.
+        outline = np.array([[0,0], [(w-a)/2,0], [(w-a)/2,b], [(w+a)/2,b],
+                            [(w+a)/2,0], [w,0], [w,h], [(w+a)/2,h],
+                            [(w+a)/2,h-b], [(w-a)/2,h-b], [(w-a)/2,h],
+                            [0,h]], dtype=float)
+
+        #The half bar is closed by the symmetry line.
+        if half is None:
+            half = self.symmetric
+        if half:
+            outline = np.vstack([outline[:6], [[w,h/2], [0,h/2]]])
+
+        #--The stress concentrates at the notch corners, so they can have a
+        #--smaller element size. It grows linearly with the distance to the
+        #--nearest corner, so that neighbouring elements differ by grading,
+        #--until it is back to the global size. Points on the notch sides
+        #--mark where that happens, or the middle between two corners.
+        refined = self.corner_el_size < 1
+        corners = outline[[i for i in self.NOTCH_CORNERS
+                           if i < len(outline)]]
+        growth = (1 - self.corner_el_size)*self.el_size_factor/(self.grading - 1) \
+            if refined else 0
+
+        points = []
+        for i, start in enumerate(outline):
+            end = outline[(i+1) % len(outline)]
+            length = np.linalg.norm(end - start)
+            if i == 5:
+                right = len(points) #Most right border where q is.
+            if half and i == 6:
+                symmetryLine = len(points)
+
+            points.append(start)
+            if not refined:
+                continue
+
+            ends = [i in self.NOTCH_CORNERS,
+                    (i+1) % len(outline) in self.NOTCH_CORNERS]
+            if all(ends) and 2*growth >= length:
+                points.append((start + end)/2)
+            elif ends[0] and growth < length:
+                points.append(start + (end - start)*growth/length)
+            if ends[1] and growth < length and (not ends[0] or
+                                                2*growth < length):
+                points.append(end - (end - start)*growth/length)
+
         #Define the boundarys node points.
-        g.point([0,0])
-        g.point([(w-a)/2,0])
-        g.point([(w-a)/2,b])
-        g.point([(w+a)/2,b])
-        g.point([(w+a)/2,0])
-        g.point([w,0])
-        g.point([w,h])
-        g.point([(w+a)/2,h])
-        g.point([(w+a)/2,h-b])
-        g.point([(w-a)/2,h-b])
-        g.point([(w-a)/2,h])
-        g.point([0,h])
+        for point in points:
+            el_size = 1
+            if refined:
+                distance = np.min(np.linalg.norm(corners - point, axis=1))
+                el_size = min(1, self.corner_el_size + (self.grading - 1)*
+                              distance/self.el_size_factor)
+            g.point(point.tolist(), el_size=el_size)
 
         #Makes the borders
-        for i in range(11):
-            if i==5:
+        for i in range(len(points) - 1):
+            if i == right:
                 g.spline([i,i+1],marker=6) #Most right border where q is.
+            elif half and i == symmetryLine:
+                g.spline([i,i+1], marker=self.SYMMETRY_MARKER)
             else:
                 g.spline([i,i+1])
 
-        g.spline([0,11], marker=12) #Moste left border where wall is.
+        g.spline([0,len(points)-1], marker=12) #Moste left border where wall is.
 
-        g.surface([0,1,2,3,4,5,6,7,8,9,10,11])
+        g.surface(list(range(len(points))))
 
         return g
 
+    def key(self):
+        """
+        Method to make a key identifying the results of the input, so saved
+        results can be matched to their input.
+
+        Returns
+        -------
+        TYPE(key): : str
+            DESCRIPTION. A hash of the fields that decide the results.
+
+        """
+        #Floats, so a value typed in the GUI matches the one from a file.
+        fields = {name: float(getattr(self, name))
+                  for name in self.RESULT_FIELDS}
+        text = json.dumps(fields, sort_keys=True)
+
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
     def save(self, filename):
         """
         Method to save the indata to a JSON file.
@@ -129,6 +250,10 @@ class InputData():
         input_data["qend"] = self.qend
         input_data["paramSteps"] = self.paramSteps
         input_data["el_type"] = self.el_type
+        input_data["solver"] = self.solver
+        input_data["corner_el_size"] = self.corner_el_size
+        input_data["grading"] = self.grading
+        input_data["symmetric"] = self.symmetric
 
         with open(filename, "w") as ofile:
             json.dump(input_data, ofile, sort_keys = True, indent = 4)
@@ -165,12 +290,69 @@ class InputData():
         self.qend = input_data["qend"]
         self.paramSteps = input_data["paramSteps"]
         self.el_type = input_data["el_type"]
+        self.solver = input_data.get("solver", "auto") #Older models lack it.
+        self.corner_el_size = input_data.get("corner_el_size", 1.0)
+        self.grading = input_data.get("grading", 1.3)
+        self.symmetric = input_data.get("symmetric", False)
+
+        self.checkRefinement()
 
 class OutputData():
     """
-    Class to store results from calculation.
+    Class to store results from calculation. Every result is a contiguous
+    NumPy array of a fixed type, where nnode is the number of nodes, nel the
+    number of elements, nen the number of element nodes and ndof the number
+    of degrees of freedom:
+
+    - a, r: (ndof, 1) float, nodal displacements and reaction forces.
+    - ed: (nel, 2*nen) float, element displacements.
+    - es, et: (nel, 3) float, element stresses and strains [xx, yy, xy].
+    - ex, ey: (nel, nen) float, element node coordinates.
+    - coords: (nnode, 2) float, node coordinates.
+    - displ: (nnode, 3) float, nodal displacement vectors with z = 0.
+    - edof: (nel, 2*nen) int, element dofs (1-based).
+    - dofs: (nnode, 2) int, node dofs (1-based).
+    - bc: (nbc,) int, dofs with prescribed displacements (1-based).
+    - topo: (nel, nen) int, element nodes (1-based).
+    - eseff, mises: (nel,) float, element von Mises stresses.
+    - eseffnod: (nel, nen) float, von Mises stresses at the element nodes.
+    - stress1, stress2: (nel, 3) float, principal stress vectors.
+    - error: (nel,) float, estimated error in energy norm of an adaptive
+      solve, relative to the energy norm of the solution.
+    - profile: (nrecord,) PROFILE_TYPE, wall time in seconds, peak memory
+      allocated in bytes and problem size of each profiled solver stage, in
+      the order they were run.
+
+    The geometry is the calfem.geometry.Geometry of the model and the other
+    fields are scalars, among them the linear solver backend used with its
+    solve time in seconds, relative residual and number of iterations, and
+    the estimated relative error and number of remeshes of an adaptive solve.
     """
 
+    #Record of one stage in the solver profile.
+    PROFILE_TYPE = np.dtype([("stage", "U16"), ("time", np.float64),
+                             ("memory", np.int64), ("ndof", np.int64),
+                             ("nel", np.int64), ("nnz", np.int64)])
+
+    #Types of the result arrays, also the fields written to a result archive.
+    ARRAY_TYPES = {"a": np.float64, "r": np.float64, "ed": np.float64,
+                   "es": np.float64, "et": np.float64, "ex": np.float64,
+                   "ey": np.float64, "coords": np.float64,
+                   "displ": np.float64, "edof": np.int64, "dofs": np.int64,
+                   "bc": np.int64, "topo": np.int64, "eseff": np.float64,
+                   "eseffnod": np.float64, "mises": np.float64,
+                   "stress1": np.float64, "stress2": np.float64,
+                   "error": np.float64, "profile": PROFILE_TYPE}
+    ARRAY_FIELDS = tuple(ARRAY_TYPES)
+    #Arrays of one dimension, read as row matrices from .mat archives.
+    VECTOR_FIELDS = ("bc", "eseff", "mises", "error", "profile")
+    SCALAR_FIELDS = ("dofsPerNode", "elType", "maxEssef", "inputKey",
+                     "backend", "solveTime", "residual", "iterations",
+                     "errorEstimate", "adaptations")
+
+    #The geometry is only added to .mat archives since it is not an array.
+    __slots__ = ARRAY_FIELDS + SCALAR_FIELDS + ("geometry",)
+
     def __init__(self):
         """
         Constructor for the output data. Initiates all to None type.
@@ -180,23 +362,191 @@ class OutputData():
         None.
 
         """
-        self.a = None
-        self.r = None
-        self.ed = None
-        self.qs = None
-        self.qt = None
-        self.ex = None
-        self.ey = None
-        self.coords = None
-        self.edof = None
-        self.geometry = None
-        self.dofsPerNode = None
-        self.elType = None
-        self.eseff = None
-        self.maxEssef = None
-        self.eseffnod = None
-        self.dofs = None
-        self.topo = None
-        self.mises = None
-        self.stress1 = None
-        self.stress2 = None
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def store(self, **fields):
+        """
+        Method to set fields of the output data. Arrays are converted to
+        contiguous arrays of their type, without a copy if they already are.
+
+        Parameters
+        ----------
+        TYPE(fields): : dict
+            DESCRIPTION. The values by field name.
+
+        Returns
+        -------
+        None.
+
+        """
+        for name, value in fields.items():
+            if name in self.ARRAY_TYPES and value is not None:
+                value = np.ascontiguousarray(value, dtype=self.ARRAY_TYPES[name])
+            setattr(self, name, value)
+
+    def update(self, output_data):
+        """
+        Method to copy all fields of another output data to this one.
+
+        Parameters
+        ----------
+        TYPE(output_data): : dataTypes.OutputData
+            DESCRIPTION. The output data to copy from.
+
+        Returns
+        -------
+        None.
+
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(output_data, name))
+
+    def save(self, filename, compress=True):
+        """
+        Method to save all results to one archive file in a single write. A
+        .mat file is written for MATLAB, any other name as a NumPy .npz file.
+
+        Parameters
+        ----------
+        TYPE(filename): : str
+            DESCRIPTION. The name of the .npz or .mat file.
+        TYPE(compress): : bool, optional
+            DESCRIPTION. Boolean to controll compression. An uncompressed .npz
+            file can be memory-mapped when loaded. The default is True.
+
+        Returns
+        -------
+        None.
+
+        """
+        results = {name: np.asarray(getattr(self, name))
+                   for name in self.ARRAY_FIELDS + self.SCALAR_FIELDS
+                   if getattr(self, name) is not None}
+
+        folder = os.path.dirname(filename)
+        if folder != "":
+            os.makedirs(folder, exist_ok=True)
+
+        if filename.endswith(".mat"):
+            import scipy.io as scio
+
+            if self.geometry is not None:
+                results["geometry"] = self.geometry
+            scio.savemat(filename, results, do_compression=compress)
+        elif compress:
+            np.savez_compressed(filename, **results)
+        else:
+            np.savez(filename, **results)
+
+    def load(self, filename, mmap=False):
+        """
+        Method to load results from an archive file written by save.
+
+        Parameters
+        ----------
+        TYPE(filename): : str
+            DESCRIPTION. The name of the .npz or .mat file.
+        TYPE(mmap): : bool, optional
+            DESCRIPTION. Boolean to memory-map the arrays read-only instead of
+            reading them, so only the parts used are read from disk. Needs an
+            uncompressed .npz file. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        if filename.endswith(".mat"):
+            if mmap:
+                raise ValueError("Only .npz archives can be memory-mapped.")
+            import scipy.io as scio
+
+            results = scio.loadmat(filename)
+            results = {name: results[name] for name in self.ARRAY_FIELDS +
+                       self.SCALAR_FIELDS if name in results}
+            for name in self.VECTOR_FIELDS:
+                if name in results:
+                    results[name] = results[name].ravel()
+
+            #Record arrays are read as MATLAB structs of 1x1 matrices.
+            if "profile" in results:
+                results["profile"] = np.array(
+                    [tuple(np.asarray(value).item() for value in record)
+                     for record in results["profile"]],
+                    dtype=self.PROFILE_TYPE)
+        elif mmap:
+            results = mapNpz(filename)
+        else:
+            with np.load(filename) as archive:
+                results = {name: archive[name] for name in archive.files}
+
+        self.store(**{name: np.asarray(value).item()
+                      if name in self.SCALAR_FIELDS else value
+                      for name, value in results.items()
+                      if name in self.ARRAY_FIELDS + self.SCALAR_FIELDS})
+
+def resultsFilename(filename):
+    """
+    Function to get the name of the results file kept next to a model file.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. The name of the JSON model file.
+
+    Returns
+    -------
+    TYPE(filename): : str
+        DESCRIPTION. The name of the .npz results file.
+
+    """
+    return os.path.splitext(filename)[0] + "_results.npz"
+
+def mapNpz(filename):
+    """
+    Function to memory-map the arrays of an uncompressed .npz file. The arrays
+    are stored as .npy files in a zip archive, so each is mapped at the offset
+    of its data in the archive.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. The name of the .npz file.
+
+    Returns
+    -------
+    TYPE(arrays): : dict
+        DESCRIPTION. Read-only numpy.memmap arrays by name, 0-d arrays are
+        read into memory.
+
+    """
+    arrays = {}
+
+    with zipfile.ZipFile(filename) as archive, open(filename, "rb") as ifile:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{filename} is compressed and can't be "
+                                 "memory-mapped, save it with compress=False.")
+
+            #The data follows the local file header and the .npy header.
+            ifile.seek(info.header_offset)
+            nameLength, extraLength = struct.unpack("<HH", ifile.read(30)[26:])
+            ifile.seek(info.header_offset + 30 + nameLength + extraLength)
+
+            version = np.lib.format.read_magic(ifile)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(ifile)
+            else:
+                header = np.lib.format.read_array_header_2_0(ifile)
+            shape, fortran, dtype = header
+
+            name = info.filename[:-4] #Strips .npy
+            if shape == ():
+                arrays[name] = np.lib.format.read_array(archive.open(info))
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode="r",
+                                         offset=ifile.tell(), shape=shape,
+                                         order="F" if fortran else "C")
+
+    return arrays
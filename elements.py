@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""
+Batched versions of the CALFEM plane stress element routines. All elements are
+handled at once as stacks of NumPy arrays, which removes the Python overhead of
+calling calfem.core once per element on fine meshes.
+"""
+import numpy as np
+
+#Sub triangle topology used by CALFEM to build a quad from four triangles
+#around its centre node. Local dofs 8 and 9 belong to the centre node.
+QUAD_SUBDOFS = np.array([[0, 1, 2, 3, 8, 9],
+                         [2, 3, 4, 5, 8, 9],
+                         [4, 5, 6, 7, 8, 9],
+                         [6, 7, 0, 1, 8, 9]])
+
+def triangleB(ex, ey):
+    """
+    Function to compute the constant strain matrices and areas for a stack of
+    triangles.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 3).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 3).
+
+    Returns
+    -------
+    TYPE(B): : numpy.ndarray
+        DESCRIPTION. Strain matrices, shape (nel, 3, 6).
+    TYPE(A): : numpy.ndarray
+        DESCRIPTION. Signed element areas, shape (nel,).
+
+    """
+    ex = np.asarray(ex, dtype=float)
+    ey = np.asarray(ey, dtype=float)
+
+    x1, x2, x3 = ex[:,0], ex[:,1], ex[:,2]
+    y1, y2, y3 = ey[:,0], ey[:,1], ey[:,2]
+
+    A = 0.5*((x2-x1)*(y3-y1) - (x3-x1)*(y2-y1))
+
+    #Shape function derivatives times 2A.
+    dx = np.stack([y2-y3, y3-y1, y1-y2], axis=1)
+    dy = np.stack([x3-x2, x1-x3, x2-x1], axis=1)
+
+    B = np.zeros((ex.shape[0], 3, 6))
+    B[:,0,0::2] = dx
+    B[:,1,1::2] = dy
+    B[:,2,0::2] = dy
+    B[:,2,1::2] = dx
+    B /= (2*A)[:,None,None]
+
+    return B, A
+
+def quadSubtriangles(ex, ey):
+    """
+    Function to split a stack of quads into the four sub triangles around the
+    element centre that CALFEM uses for planqe and planqs.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 4).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 4).
+
+    Returns
+    -------
+    TYPE(exs): : numpy.ndarray
+        DESCRIPTION. Sub triangle x coordinates, shape (nel, 4, 3).
+    TYPE(eys): : numpy.ndarray
+        DESCRIPTION. Sub triangle y coordinates, shape (nel, 4, 3).
+
+    """
+    ex = np.asarray(ex, dtype=float)
+    ey = np.asarray(ey, dtype=float)
+
+    corners = np.array([[0, 1], [1, 2], [2, 3], [3, 0]])
+
+    exs = np.empty((ex.shape[0], 4, 3))
+    eys = np.empty((ey.shape[0], 4, 3))
+    exs[:,:,:2] = ex[:,corners]
+    eys[:,:,:2] = ey[:,corners]
+    exs[:,:,2] = ex.mean(axis=1)[:,None]
+    eys[:,:,2] = ey.mean(axis=1)[:,None]
+
+    return exs, eys
+
+def planteBatch(ex, ey, ep, D):
+    """
+    Function to compute the plane stress stiffness matrices for all triangle
+    elements at once. Matches calfem.core.plante element by element.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 3).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 3).
+    TYPE(ep): : list
+        DESCRIPTION. Element properties [ptype, t].
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+
+    Returns
+    -------
+    TYPE(Ke): : numpy.ndarray
+        DESCRIPTION. Element stiffness matrices, shape (nel, 6, 6).
+
+    """
+    t = ep[1]
+    D = np.asarray(D, dtype=float)
+
+    B, A = triangleB(ex, ey)
+
+    return np.einsum('eki,kl,elj->eij', B, D, B)*(A*t)[:,None,None]
+
+def planqeBatch(ex, ey, ep, D):
+    """
+    Function to compute the plane stress stiffness matrices for all quad
+    elements at once. Each quad is built from four triangles around its centre
+    node, which is then removed by static condensation as in
+    calfem.core.planqe.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 4).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 4).
+    TYPE(ep): : list
+        DESCRIPTION. Element properties [ptype, t].
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+
+    Returns
+    -------
+    TYPE(Ke): : numpy.ndarray
+        DESCRIPTION. Element stiffness matrices, shape (nel, 8, 8).
+
+    """
+    K10 = quadStiffness10(ex, ey, ep, D)
+
+    Kaa = K10[:,:8,:8]
+    Kab = K10[:,:8,8:]
+    Kbb = K10[:,8:,8:]
+
+    return Kaa - Kab @ np.linalg.solve(Kbb, np.swapaxes(Kab, 1, 2))
+
+def quadStiffness10(ex, ey, ep, D):
+    """
+    Function to compute the uncondensed 10x10 quad stiffness matrices, i.e.
+    including the two dofs of the centre node.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 4).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 4).
+    TYPE(ep): : list
+        DESCRIPTION. Element properties [ptype, t].
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+
+    Returns
+    -------
+    TYPE(K10): : numpy.ndarray
+        DESCRIPTION. Stiffness matrices, shape (nel, 10, 10).
+
+    """
+    exs, eys = quadSubtriangles(ex, ey)
+    nel = exs.shape[0]
+
+    Ksub = planteBatch(exs.reshape(-1, 3), eys.reshape(-1, 3), ep, D)
+    Ksub = Ksub.reshape(nel, 4, 6, 6)
+
+    K10 = np.zeros((nel, 10, 10))
+    for i, subdofs in enumerate(QUAD_SUBDOFS):
+        K10[:,subdofs[:,None],subdofs[None,:]] += Ksub[:,i]
+
+    return K10
+
+def plantsBatch(ex, ey, ep, D, ed):
+    """
+    Function to compute the plane stress element stresses and strains for all
+    triangle elements at once. Matches calfem.core.plants.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 3).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 3).
+    TYPE(ep): : list
+        DESCRIPTION. Element properties [ptype, t].
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+    TYPE(ed): : numpy.ndarray
+        DESCRIPTION. Element displacements, shape (nel, 6).
+
+    Returns
+    -------
+    TYPE(es): : numpy.ndarray
+        DESCRIPTION. Element stresses [sigx, sigy, tauxy], shape (nel, 3).
+    TYPE(et): : numpy.ndarray
+        DESCRIPTION. Element strains [epsx, epsy, gamxy], shape (nel, 3).
+
+    """
+    D = np.asarray(D, dtype=float)
+
+    B, A = triangleB(ex, ey)
+
+    et = np.einsum('eij,ej->ei', B, np.asarray(ed, dtype=float))
+
+    return et @ D.T, et
+
+def planqsBatch(ex, ey, ep, D, ed):
+    """
+    Function to compute the plane stress element stresses and strains for all
+    quad elements at once. As in calfem.core.planqs the centre node
+    displacements are recovered from the condensed dofs and the result is
+    the area weighted mean over the four sub triangles.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element x coordinates, shape (nel, 4).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element y coordinates, shape (nel, 4).
+    TYPE(ep): : list
+        DESCRIPTION. Element properties [ptype, t].
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+    TYPE(ed): : numpy.ndarray
+        DESCRIPTION. Element displacements, shape (nel, 8).
+
+    Returns
+    -------
+    TYPE(es): : numpy.ndarray
+        DESCRIPTION. Element stresses [sigx, sigy, tauxy], shape (nel, 3).
+    TYPE(et): : numpy.ndarray
+        DESCRIPTION. Element strains [epsx, epsy, gamxy], shape (nel, 3).
+
+    """
+    D = np.asarray(D, dtype=float)
+    ed = np.asarray(ed, dtype=float)
+    nel = ed.shape[0]
+
+    #Centre node displacements that minimize the energy for the given ed.
+    K10 = quadStiffness10(ex, ey, ep, D)
+    ac = -np.linalg.solve(K10[:,8:,8:], K10[:,8:,:8] @ ed[:,:,None])[:,:,0]
+    a10 = np.concatenate([ed, ac], axis=1)
+
+    exs, eys = quadSubtriangles(ex, ey)
+    B, A = triangleB(exs.reshape(-1, 3), eys.reshape(-1, 3))
+    B = B.reshape(nel, 4, 3, 6)
+    A = A.reshape(nel, 4)
+
+    ets = np.einsum('esij,esj->esi', B, a10[:,QUAD_SUBDOFS])
+    et = np.einsum('esi,es->ei', ets, A)/A.sum(axis=1)[:,None]
+
+    return et @ D.T, et
+
+def scatterIndices(edof):
+    """
+    Function to compute the global row and column index of every entry in a
+    stack of element matrices, flattened in C order.
+
+    Parameters
+    ----------
+    TYPE(edof): : numpy.ndarray
+        DESCRIPTION. Element topology with 1-based dofs, shape (nel, neldof).
+
+    Returns
+    -------
+    TYPE(rows): : numpy.ndarray
+        DESCRIPTION. 0-based global rows, shape (nel*neldof*neldof,).
+    TYPE(cols): : numpy.ndarray
+        DESCRIPTION. 0-based global columns, shape (nel*neldof*neldof,).
+
+    """
+    idx = np.asarray(edof, dtype=np.int64) - 1
+    neldof = idx.shape[1]
+
+    rows = np.repeat(idx, neldof, axis=1).ravel()
+    cols = np.tile(idx, (1, neldof)).ravel()
+
+    return rows, cols
+
+def stress2nodalBatch(eseff, edof):
+    """
+    Function to convert element effective stresses to nodal effective stresses
+    for all elements at once. Gives the same result as
+    calfem.core.stress2nodal.
+
+    Parameters
+    ----------
+    TYPE(eseff): : numpy.ndarray
+        DESCRIPTION. Element effective stresses, shape (nel,).
+    TYPE(edof): : numpy.ndarray
+        DESCRIPTION. Element topology with 1-based dofs, shape (nel, neldof).
+
+    Returns
+    -------
+    TYPE(ev): : numpy.ndarray
+        DESCRIPTION. Nodal values for each element, shape (nel, nen).
+
+    """
+    edof = np.asarray(edof, dtype=np.int64)
+    neldof = edof.shape[1]
+    elnodes = neldof//2
+
+    weights = np.repeat(np.asarray(eseff, dtype=float)/elnodes, neldof)
+    values = np.bincount((edof-1).ravel(), weights=weights,
+                         minlength=edof.max())
+
+    return values[edof[:,0::2]-1]
+
+def coordxtrBatch(edof, coords, dofs):
+    """
+    Function to extract the element node coordinates of all elements at once.
+    Gives the same result as calfem.core.coordxtr for two dofs per node.
+
+    Parameters
+    ----------
+    TYPE(edof): : numpy.ndarray
+        DESCRIPTION. Element topology with 1-based dofs, shape (nel, neldof).
+    TYPE(coords): : numpy.ndarray
+        DESCRIPTION. Node coordinates, shape (nnode, 2).
+    TYPE(dofs): : numpy.ndarray
+        DESCRIPTION. Node dofs (1-based), shape (nnode, 2).
+
+    Returns
+    -------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element node x coordinates, shape (nel, nen).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element node y coordinates, shape (nel, nen).
+
+    """
+    edof = np.asarray(edof, dtype=np.int64)
+    dofs = np.asarray(dofs, dtype=np.int64)
+    coords = np.asarray(coords, dtype=float)
+
+    #Node of every x dof, the x dofs are every other dof of an element.
+    node = np.zeros(dofs.max(), dtype=np.int64)
+    node[dofs[:,0]-1] = np.arange(dofs.shape[0])
+    elnodes = node[edof[:,0::2]-1]
+
+    return coords[elnodes,0], coords[elnodes,1]
+
+def elementAreas(ex, ey):
+    """
+    Function to compute the area of all elements at once, triangles or quads
+    with the nodes in order around the element.
+
+    Parameters
+    ----------
+    TYPE(ex): : numpy.ndarray
+        DESCRIPTION. Element node x coordinates, shape (nel, nen).
+    TYPE(ey): : numpy.ndarray
+        DESCRIPTION. Element node y coordinates, shape (nel, nen).
+
+    Returns
+    -------
+    TYPE(area): : numpy.ndarray
+        DESCRIPTION. Element areas, shape (nel,).
+
+    """
+    ex = np.asarray(ex, dtype=float)
+    ey = np.asarray(ey, dtype=float)
+
+    return 0.5*np.abs(np.sum(ex*np.roll(ey, -1, axis=1) -
+                             np.roll(ex, -1, axis=1)*ey, axis=1))
+
+def zzErrorBatch(es, topo, area, D):
+    """
+    Function to estimate the error in energy norm of all elements at once by
+    Zienkiewicz-Zhu stress recovery. The recovered nodal stresses are the
+    area weighted mean of the constant stresses of the elements around the
+    node, and the error of an element is the energy norm of the difference
+    to its stress, integrated by the mean over the element nodes.
+
+    Parameters
+    ----------
+    TYPE(es): : numpy.ndarray
+        DESCRIPTION. Element stresses [sigx, sigy, tauxy], shape (nel, 3).
+    TYPE(topo): : numpy.ndarray
+        DESCRIPTION. Element nodes (1-based), shape (nel, nen).
+    TYPE(area): : numpy.ndarray
+        DESCRIPTION. Element volumes, i.e. area times thickness, shape
+        (nel,).
+    TYPE(D): : numpy.ndarray
+        DESCRIPTION. Constitutive matrix, shape (3, 3).
+
+    Returns
+    -------
+    TYPE(error): : numpy.ndarray
+        DESCRIPTION. Estimated error in energy norm, shape (nel,).
+    TYPE(norm): : numpy.ndarray
+        DESCRIPTION. Energy norm of the recovered stresses, shape (nel,).
+
+    """
+    es = np.asarray(es, dtype=float)
+    nodes = np.asarray(topo, dtype=np.int64) - 1
+    nen = nodes.shape[1]
+    nnode = nodes.max() + 1
+
+    weights = np.repeat(np.asarray(area, dtype=float), nen)
+    total = np.bincount(nodes.ravel(), weights=weights, minlength=nnode)
+    recovered = np.column_stack(
+        [np.bincount(nodes.ravel(), weights=weights*np.repeat(es[:,i], nen),
+                     minlength=nnode) for i in range(3)])/total[:,None]
+
+    elementRecovered = recovered[nodes]          #(nel, nen, 3)
+    difference = elementRecovered - es[:,None,:]
+    C = np.linalg.inv(D)
+
+    error = area*np.einsum("eni,ij,enj->e", difference, C, difference)/nen
+    norm = area*np.einsum("eni,ij,enj->e", elementRecovered, C,
+                          elementRecovered)/nen
+
+    return np.sqrt(error), np.sqrt(norm)
+
+def stressMeasures(es):
+    """
+    Function to compute the von Misses stress and the principal stress vectors
+    for all elements at once from plane stress element stresses.
+
+    Parameters
+    ----------
+    TYPE(es): : numpy.ndarray
+        DESCRIPTION. Element stresses [sigx, sigy, tauxy], shape (nel, 3).
+
+    Returns
+    -------
+    TYPE(mises): : numpy.ndarray
+        DESCRIPTION. Von Misses stresses, shape (nel,).
+    TYPE(stress1): : numpy.ndarray
+        DESCRIPTION. Principal stress 1 as a vector in its principal
+        direction, shape (nel, 3).
+    TYPE(stress2): : numpy.ndarray
+        DESCRIPTION. Principal stress 2 as a vector in its principal
+        direction, shape (nel, 3).
+
+    """
+    es = np.asarray(es, dtype=float)
+    sx, sy, txy = es[:,0], es[:,1], es[:,2]
+
+    mises = np.sqrt(sx*sx - sx*sy + sy*sy + 3*txy*txy)
+
+    #Principal directions and stresses from Mohr's circle.
+    theta = 0.5*np.arctan2(2*txy, sx-sy)
+    centre = 0.5*(sx + sy)
+    radius = np.hypot(0.5*(sx - sy), txy)
+
+    sigma1 = centre + radius
+    sigma2 = centre - radius
+
+    stress1 = np.zeros((es.shape[0], 3))
+    stress1[:,0] = sigma1*np.cos(theta)
+    stress1[:,1] = sigma1*np.sin(theta)
+
+    stress2 = np.zeros((es.shape[0], 3))
+    stress2[:,0] = sigma2*np.cos(theta + 0.5*np.pi)
+    stress2[:,1] = sigma2*np.sin(theta + 0.5*np.pi)
+
+    return mises, stress1, stress2
@@ -7,11 +7,13 @@ from PyQt5.QtWidgets import QApplication
 
 from userInterface import MainWindow
 
-app = QApplication(sys.argv) #Creates an app
+#Guarded so worker processes of parameter studies can import this module.
+if __name__ == "__main__":
+    app = QApplication(sys.argv) #Creates an app
 
-#--Makes and shows an main window.
-widget = MainWindow(app)
-widget.show()
+    #--Makes and shows an main window.
+    widget = MainWindow(app)
+    widget.show()
 
-#Starts the code
-sys.exit(app.exec_())
+    #Starts the code
+    sys.exit(app.exec_())
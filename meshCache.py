@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of generated meshes, kept in memory and optionally on disk, so a model
+is only meshed again when its geometry or meshing input changes.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+class MeshCache():
+    """
+    Class to cache generated meshes so GMSH is only launched when the geometry
+    or meshing parameters change. Meshes are kept in memory and, if a
+    directory is given, also stored as .npz files on disk. The dof partition
+    of a mesh is kept in memory together with the mesh.
+    """
+
+    #InputData fields that decide the mesh.
+    MESH_FIELDS = ("h", "w", "a", "b", "el_size_factor", "el_type",
+                   "corner_el_size", "grading", "symmetric")
+
+    def __init__(self, directory=None, max_entries=8):
+        """
+        Constructor for the mesh cache.
+
+        Parameters
+        ----------
+        TYPE(directory): : str, optional
+            DESCRIPTION. Directory for the on-disk store. The default is None
+            (memory only).
+        TYPE(max_entries): : int, optional
+            DESCRIPTION. Number of meshes kept in memory, the least recently
+            used is dropped first. The default is 8.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.meshes = OrderedDict()
+        self.partitions = {}
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        """
+        Method to pickle the cache without the meshes in memory, so only the
+        on-disk store is shared with worker processes.
+
+        Returns
+        -------
+        TYPE(state): : dict
+            DESCRIPTION. The state of the cache.
+
+        """
+        state = self.__dict__.copy()
+        state["meshes"] = OrderedDict()
+        state["partitions"] = {}
+        return state
+
+    def key(self, input_data):
+        """
+        Method to make the cache key for the mesh of an input.
+
+        Parameters
+        ----------
+        TYPE(input_data): : dataTypes.InputData
+            DESCRIPTION. The input to make a key for.
+
+        Returns
+        -------
+        TYPE(key): : str
+            DESCRIPTION. A hash of the fields that decide the mesh.
+
+        """
+        fields = {name: getattr(input_data, name)
+                  for name in self.MESH_FIELDS}
+        text = json.dumps(fields, sort_keys=True, default=float)
+
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Method to look up a mesh, first in memory and then on disk.
+
+        Parameters
+        ----------
+        TYPE(key): : str
+            DESCRIPTION. The cache key.
+
+        Returns
+        -------
+        TYPE(mesh): : tuple or None
+            DESCRIPTION. (coords, edof, dofs, bdofs, elementmarkers, topo) or
+            None if the mesh is not cached.
+
+        """
+        if key in self.meshes:
+            self.meshes.move_to_end(key)
+            return self.meshes[key]
+
+        filename = self.__filename(key)
+        if filename is None or not os.path.exists(filename):
+            return None
+
+        with np.load(filename) as data:
+            bdofs = {int(name[6:]): data[name].tolist()
+                     for name in data.files if name.startswith("bdofs_")}
+            mesh = (data["coords"], data["edof"], data["dofs"], bdofs,
+                    data["elementmarkers"].tolist(), data["topo"])
+
+        self.__remember(key, mesh)
+        return mesh
+
+    def put(self, key, mesh):
+        """
+        Method to add a mesh to the cache.
+
+        Parameters
+        ----------
+        TYPE(key): : str
+            DESCRIPTION. The cache key.
+        TYPE(mesh): : tuple
+            DESCRIPTION. (coords, edof, dofs, bdofs, elementmarkers, topo).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.__remember(key, mesh)
+
+        filename = self.__filename(key)
+        if filename is not None:
+            coords, edof, dofs, bdofs, elementmarkers, topo = mesh
+            arrays = {f"bdofs_{marker}": np.asarray(values, dtype=int)
+                      for marker, values in bdofs.items()}
+            np.savez(filename, coords=coords, edof=edof, dofs=dofs,
+                     elementmarkers=np.asarray(elementmarkers), topo=topo,
+                     **arrays)
+
+    def getPartition(self, key):
+        """
+        Method to look up the dof partition of a cached mesh.
+
+        Parameters
+        ----------
+        TYPE(key): : str
+            DESCRIPTION. The cache key of the mesh.
+
+        Returns
+        -------
+        TYPE(partition): : solvers.DofPartition or None
+            DESCRIPTION. The partition or None if it is not cached.
+
+        """
+        return self.partitions.get(key)
+
+    def putPartition(self, key, partition):
+        """
+        Method to add the dof partition of a mesh in memory. It is dropped
+        together with the mesh.
+
+        Parameters
+        ----------
+        TYPE(key): : str
+            DESCRIPTION. The cache key of the mesh.
+        TYPE(partition): : solvers.DofPartition
+            DESCRIPTION. The partition of the mesh.
+
+        Returns
+        -------
+        None.
+
+        """
+        if key in self.meshes:
+            self.partitions[key] = partition
+
+    def clear(self):
+        """
+        Method to empty the in-memory cache. The on-disk store is kept.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.meshes.clear()
+        self.partitions.clear()
+
+    def __remember(self, key, mesh):
+        """
+        Helpmethod to keep a mesh in memory and drop the least recently used
+        mesh if the cache is full.
+
+        """
+        self.meshes[key] = mesh
+        self.meshes.move_to_end(key)
+        while len(self.meshes) > self.max_entries:
+            dropped, _ = self.meshes.popitem(last=False)
+            self.partitions.pop(dropped, None)
+
+    def __filename(self, key):
+        """
+        Helpmethod to get the .npz file of a key, None without a directory.
+
+        """
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key + ".npz")
@@ -5,17 +5,44 @@ Created on Mon Apr 1 15:42:47 2020
 @author: Pontus Nordqvist
 @email: p.nordq@gmail.com
 """
-import calfem.vis_mpl as cfv
-import tabulate as tbl
-import matplotlib.cm as cm
-import matplotlib.colors as mcolors
+import sys
+
 import numpy as np
 
+def visMpl():
+    """
+    Function to import the CALFEM plotting module on first use. It loads
+    matplotlib, which is slow and not needed until something is plotted.
+
+    Returns
+    -------
+    TYPE(cfv): : module
+        DESCRIPTION. The calfem.vis_mpl module.
+
+    """
+    import calfem.vis_mpl as cfv
+    return cfv
+
 class Report():
     """
-    Class to present input and output in report form.
+    Class to present input and output in report form. A short summary is
+    made directly, while the large tables are read from the output data row
+    by row when they are shown.
     """
 
+    #Tables of the report as (title, OutputData field, headers, scale,
+    #integer). The field is multiplied by scale and shown as integers if
+    #integer is True.
+    TABLES = (("Coordinates", "coords", ["x","y"], 1, False),
+              ("Coordinate dofs", "dofs", ["x","y"], 1, True),
+              ("Topology", "edof", (), 1, True),
+              ("Element coordinates x", "ex", (), 1, False),
+              ("Element coordinates y", "ey", (), 1, False),
+              ("Displacements (magnified by 1000)", "ed", (), 1000, False),
+              ("Reactions", "r", (), 1, False),
+              ("Nodal displacements (magnified by 1000)", "a", (), 1000,
+               False))
+
     def __init__(self, input_data, output_data):
         """
         Constructor for the report. Initializes to an empty report.
@@ -63,10 +90,121 @@ class Report():
         """
         self.report+=str(text)
 
+    def summary(self):
+        """
+        Returns the model input and the problem size and extreme values of the
+        results. It is cheap to make regardless of the mesh size.
+
+        Returns
+        -------
+        TYPE(self.report): : str
+            DESCRIPTION. The summary as an string.
+
+        """
+        output_data = self.output_data
+
+        self.clear()
+        self.add_text("-------------- Model input --------------------------\n")
+        self.add_text("t = " + str(self.input_data.t) + " m\n")
+        self.add_text("E = " + str(self.input_data.E) + " Pa\n")
+        self.add_text("v = " + str(self.input_data.v) + "\n")
+        self.add_text("-------------- Results ------------------------------\n")
+        self.add_text(f"Nodes: {np.shape(output_data.coords)[0]}\n")
+        self.add_text(f"Elements: {np.shape(output_data.edof)[0]}\n")
+        self.add_text(f"Degrees of freedom: {np.size(output_data.dofs)}\n")
+        self.add_text("Max displacement: "
+                      f"{np.max(np.abs(output_data.a)):.4e} m\n")
+        self.add_text(f"Max reaction: {np.max(np.abs(output_data.r)):.4e} N\n")
+        self.add_text(f"Max von Mises stress: {output_data.maxEssef:.4e} Pa\n")
+        if output_data.backend is not None:
+            self.add_text(f"Linear solver: {output_data.backend}, "
+                          f"{output_data.solveTime:.3f} s, relative residual "
+                          f"{output_data.residual:.1e}")
+            if output_data.iterations:
+                self.add_text(f", {output_data.iterations} iterations")
+            self.add_text("\n")
+        if self.input_data.symmetric:
+            self.add_text("Solved as the symmetric lower half, mirrored to "
+                          "the full bar\n")
+        if output_data.errorEstimate is not None:
+            self.add_text(f"Adaptive mesh: {output_data.adaptations} "
+                          "remeshes, estimated relative error "
+                          f"{output_data.errorEstimate*100:.2f} %\n")
+
+        if output_data.profile is not None and len(output_data.profile) > 0:
+            self.add_text("-------------- Profile ------------------------------\n")
+            self.add_text(f"{'Stage':16s}{'Calls':>6s}{'Time [s]':>10s}"
+                          f"{'Peak [MB]':>11s}{'ndof':>9s}{'nel':>9s}"
+                          f"{'nnz':>10s}\n")
+            for row in self.profile():
+                self.add_text(f"{row[0]:16s}{row[1]:6d}{row[2]:10.3f}"
+                              f"{row[3]/2**20:11.1f}{row[4]:9d}{row[5]:9d}"
+                              f"{row[6]:10d}\n")
+
+        return self.report
+
+    def profile(self):
+        """
+        Returns the solver profile summed over the runs of each stage, in the
+        order the stages were first run.
+
+        Returns
+        -------
+        TYPE(rows): : list
+            DESCRIPTION. (stage, calls, total time, peak memory, ndof, nel,
+            nnz) for each stage, with the largest problem size of its runs.
+
+        """
+        profile = self.output_data.profile
+        stages = list(dict.fromkeys(profile["stage"]))
+        rows = []
+
+        for stage in stages:
+            records = profile[profile["stage"] == stage]
+            rows.append((str(stage), len(records),
+                         float(records["time"].sum()),
+                         int(records["memory"].max()),
+                         int(records["ndof"].max()),
+                         int(records["nel"].max()),
+                         int(records["nnz"].max())))
+
+        return rows
+
+    def table(self, index):
+        """
+        Returns a table of the report without formatting it.
+
+        Parameters
+        ----------
+        TYPE(index): : int
+            DESCRIPTION. Index of the table in TABLES.
+
+        Returns
+        -------
+        TYPE(title): : str
+            DESCRIPTION. The title of the table.
+        TYPE(values): : numpy.ndarray
+            DESCRIPTION. The unscaled values, shape (nrow, ncol).
+        TYPE(headers): : list
+            DESCRIPTION. The column names, empty to number the columns.
+        TYPE(scale): : float
+            DESCRIPTION. Factor to multiply the values with when shown.
+        TYPE(integer): : bool
+            DESCRIPTION. Boolean to show the values as integers.
+
+        """
+        title, field, headers, scale, integer = self.TABLES[index]
+        values = np.asarray(getattr(self.output_data, field))
+        if values.ndim == 1:
+            values = values.reshape(-1, 1)
+
+        return title, values, list(headers), scale, integer
+
     def __str__(self):
         """
-        Returns a printable string object of the report. Uses a 'psql'
-        np.tabulate format to do nice printing of certain data.
+        Returns a printable string object of the full report. Uses a 'psql'
+        np.tabulate format to do nice printing of certain data. Note that all
+        tables are formatted, which is slow for fine meshes.
 
         Returns
         -------
@@ -74,47 +212,25 @@ class Report():
             DESCRIPTION. A report as an string.
 
         """
+        import tabulate as tbl
+
         self.clear()
         self.add_text()
         self.add_text("-------------- Model input --------------------------\n")
         self.add_text("t = " + str(self.input_data.t) + " m\n")
         self.add_text("E = " + str(self.input_data.E) + " Pa\n")
         self.add_text("v = " + str(self.input_data.v) + "\n")
-        self.add_text("-------------- Results ------------------------------\n")
-        self.add_text("Coordinates:\n")
-        self.add_text(tbl.tabulate(self.output_data.coords,headers = ["x","y"],
-                                   numalign="right", floatfmt=".3f",
-                                   tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Coordinate dofs:\n")
-        self.add_text(tbl.tabulate(self.output_data.dofs.astype(int),
-                                   headers = ["x","y"],numalign="right",
-                                   floatfmt=".3f",tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Topology:\n")
-        self.add_text(tbl.tabulate(self.output_data.edof.astype(int),
-                                   numalign="right",floatfmt=".3f",
-                                   tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Element coordinates x:\n")
-        self.add_text(tbl.tabulate(self.output_data.ex,numalign="right",
-                                   floatfmt=".3f",tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Element coordinates y:\n")
-        self.add_text(tbl.tabulate(self.output_data.ey,numalign="right",
-                                   floatfmt=".3f",tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Displacements (magnified by 1000):\n")
-        self.add_text(tbl.tabulate(self.output_data.ed*1000,numalign="right",
-                                   floatfmt=".3f", tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Reactions:\n")
-        self.add_text(tbl.tabulate(self.output_data.r,numalign="right",
-                                   floatfmt=".3f",tablefmt="psql"))
-        self.add_text("\n")
-        self.add_text("Nodal displacements (magnified by 1000):\n")
-        self.add_text(tbl.tabulate(self.output_data.a*1000,numalign="right",
-                                   floatfmt=".3f",tablefmt="psql"))
+        self.add_text("-------------- Results ------------------------------")
+
+        for index in range(len(self.TABLES)):
+            title, values, headers, scale, integer = self.table(index)
+            values = values.astype(int) if integer else values*scale
+
+            self.add_text("\n")
+            self.add_text(title + ":\n")
+            self.add_text(tbl.tabulate(values, headers = headers,
+                                       numalign="right", floatfmt=".3f",
+                                       tablefmt="psql"))
 
         return self.report
 
@@ -161,6 +277,7 @@ class Visualization():
         None.
 
         """
+        cfv = visMpl()
         geometry = self.output_data.geometry
 
         self.geomFig = cfv.figure(self.geomFig)
@@ -177,14 +294,16 @@ class Visualization():
         None.
 
         """
+        cfv = visMpl()
         coords = self.output_data.coords
         edof = self.output_data.edof
         dofs_per_node = self.output_data.dofsPerNode
+        el_type = self.output_data.elType
 
         self.meshFig = cfv.figure(self.meshFig)
         cfv.clf()
-        cfv.draw_mesh(coords, edof, dofs_per_node, el_type=2, filled=True,
-                      title="Mesh (m)")
+        cfv.draw_mesh(coords, edof, dofs_per_node, el_type=el_type,
+                      filled=True, title="Mesh (m)")
         self.meshFig = True
 
     def showElementValues(self):
@@ -196,6 +315,10 @@ class Visualization():
         None.
 
         """
+        import matplotlib.cm as cm
+        import matplotlib.colors as mcolors
+        cfv = visMpl()
+
         eseff = self.output_data.eseff
         coords = self.output_data.coords
         edof = self.output_data.edof
@@ -210,7 +333,7 @@ class Visualization():
         colormap = cm.viridis
         normalize = mcolors.Normalize(vmin=np.min(eseff), vmax=np.max(eseff))
         s_map = cm.ScalarMappable(norm=normalize, cmap=colormap)
-        self.elValueFig.colorbar(s_map)
+        self.elValueFig.colorbar(s_map, ax=self.elValueFig.gca())
         self.elValueFig = True
 
     def showDisplacement(self):
@@ -223,7 +346,8 @@ class Visualization():
         None.
 
         """
-        a = self.output_data.a
+        cfv = visMpl()
+        displ = self.output_data.displ[:,:2] #Displacement of each node.
         coords = self.output_data.coords
         edof = self.output_data.edof
         dofs_per_node = self.output_data.dofsPerNode
@@ -231,7 +355,7 @@ class Visualization():
 
         self.displacementFig = cfv.figure(self.displacementFig)
         cfv.clf()
-        cfv.draw_displacements(a=a, coords=coords, edof=edof,
+        cfv.draw_displacements(a=displ, coords=coords, edof=edof,
                                dofs_per_node=dofs_per_node, el_type=el_type,
                                color=(30,144,255),
                                draw_undisplaced_mesh=self.drawUndisplaced,
@@ -254,7 +378,10 @@ class Visualization():
         self.elValueFig = None
         self.nodeValueFig = None
         self.drawUndisplaced  = False
-        cfv.closeAll()
+
+        #No figures can be open before the plotting module is loaded.
+        if "calfem.vis_mpl" in sys.modules:
+            visMpl().closeAll()
 
     def wait(self):
         """
@@ -266,4 +393,4 @@ class Visualization():
         None.
 
         """
-        cfv.show_and_wait()
+        visMpl().show_and_wait()
@@ -5,20 +5,41 @@ Created on Mon Apr 1 15:42:47 2020
 @author: Pontus Nordqvist
 @email: p.nordq@gmail.com
 """
+import copy
+import importlib.util
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
+import scipy.linalg as scl
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
 import calfem.core as cfc
-import calfem.mesh as cfm
-import calfem.utils as cfu
-import pyvtk as vtk
-import math
-import scipy.io as scio
+
+import elements as elm
+import vtkFiles as vtf
+from dataTypes import OutputData
+from meshCache import MeshCache
+
+#Mesh cache shared by all solvers, so GMSH is skipped on unchanged geometry.
+MESH_CACHE = MeshCache()
 
 class Solver():
     """
     Class to handle solution to our computational model.
     """
 
-    def __init__(self, input_data, output_data, mat_save=False):
+    def __init__(self, input_data, output_data, mat_save=False,
+                 sparse_limit=2000, factorize_once=True, superpose=True,
+                 workers=1, vtk_format="vtk", vtk_compress=True,
+                 mesh_cache=MESH_CACHE, vtk_dir="vtks", progress=None,
+                 warm_start=True, rtol=1e-10, profile=False,
+                 stage_hook=None, adaptive_tol=None, adaptive_steps=5):
         """
         Constructor for the solver. Loads data from a InputData object and
         assign it to a OutputData object.
@@ -30,8 +51,82 @@ class Solver():
         TYPE(output_data) : plantmodel.OutputData
             DESCRIPTION. An OutputData object to save output data to.
         TYPE(mat_save) : bool
-            DESCRIPTION. Boolean to controll if the solvers save result to
-                         MALTAB data. Default to False (No saving).
+            DESCRIPTION. Boolean to controll if the solvers save all results
+                         of each run to one compressed MATLAB archive in
+                         MATLABSaves, see OutputData.save. Default to False
+                         (No saving).
+        TYPE(sparse_limit) : int
+            DESCRIPTION. Number of free degrees of freedom above which the
+                         "auto" backend uses a sparse solver instead of a
+                         dense Cholesky factorization. The stiffness matrix
+                         is always assembled in sparse form.
+                         Default to 2000.
+        TYPE(factorize_once) : bool
+            DESCRIPTION. Boolean to controll if a parameter study on q meshes,
+                         assembles and factorizes the model once and solves
+                         all load cases together. Default to True.
+        TYPE(superpose) : bool
+            DESCRIPTION. Boolean to controll if a parameter study on q solves
+                         once for a unit load and scales the solution to each
+                         q, which is valid since the model is linear and all
+                         prescribed displacements are zero. Takes precedence
+                         over factorize_once. Default to True.
+        TYPE(workers) : int
+            DESCRIPTION. Number of processes used for a parameter study on b.
+                         Default to 1 (serial).
+        TYPE(vtk_format) : str
+            DESCRIPTION. Format of exported frames, "vtk" for legacy ascii,
+                         "vtu" for binary VTK XML with a .pvd collection
+                         indexing a parameter study or "xdmf" to store a
+                         study on q as one XDMF series sharing the mesh
+                         (a study on b is then written as "vtu").
+                         Default to "vtk".
+        TYPE(vtk_compress) : bool
+            DESCRIPTION. Boolean to controll zlib compression of .vtu files.
+                         Default to True.
+        TYPE(mesh_cache) : meshCache.MeshCache
+            DESCRIPTION. Cache to reuse meshes when the geometry and meshing
+                         parameters are unchanged, None to always mesh.
+                         Default to an in-memory cache shared by all solvers.
+        TYPE(vtk_dir) : str
+            DESCRIPTION. Directory where parameter studies are exported, in
+                         the subdirectories bParam and qParam.
+                         Default to "vtks".
+        TYPE(progress) : function
+            DESCRIPTION. Function called as progress(step, steps, filename)
+                         when a step of a parameter study is exported, with
+                         step counting the finished steps. Default to None.
+        TYPE(warm_start) : bool
+            DESCRIPTION. Boolean to controll if a serial parameter study on b
+                         with the pcg backend starts each solve from the
+                         displacements of the previous step, interpolated to
+                         the new mesh. Default to True.
+        TYPE(rtol) : float
+            DESCRIPTION. Relative residual the pcg backend iterates to. A
+                         looser tolerance gains more from a warm start.
+                         Default to 1e-10.
+        TYPE(profile) : bool
+            DESCRIPTION. Boolean to controll if the wall time, peak memory
+                         and problem size of every stage are recorded to the
+                         profile of the output data, see Solver.stage.
+                         Tracing the memory slows the solver down by some
+                         per cent. Default to False.
+        TYPE(stage_hook) : function
+            DESCRIPTION. Function called as stage_hook(record) when a stage
+                         is finished, with the record as a dict of the
+                         OutputData.PROFILE_TYPE fields. Without profile
+                         only the wall time and problem size are recorded,
+                         with the memory as 0. Default to None.
+        TYPE(adaptive_tol) : float
+            DESCRIPTION. Relative error in energy norm, estimated by
+                         Zienkiewicz-Zhu stress recovery, that the mesh is
+                         refined to by remeshing with a local element size
+                         field, see Solver.adaptMesh. None to only use the
+                         mesh of el_size_factor. Default to None.
+        TYPE(adaptive_steps) : int
+            DESCRIPTION. Largest number of remeshes of an adaptive solve.
+                         Default to 5.
+
         Returns
         -------
         None.
@@ -42,152 +137,732 @@ class Solver():
         self.ex = None
         self.ey = None
         self.mat_save = mat_save
+        self.sparse_limit = sparse_limit
+        self.factorize_once = factorize_once
+        self.superpose = superpose
+        self.workers = workers
+        self.vtk_format = vtk_format
+        self.vtk_compress = vtk_compress
+        self.mesh_cache = mesh_cache
+        self.vtk_dir = vtk_dir
+        self.progress = progress
+        self.warm_start = warm_start
+        self.rtol = rtol
+        self.profile = profile
+        self.stage_hook = stage_hook
+        self.adaptive_tol = adaptive_tol
+        self.adaptive_steps = adaptive_steps
+        self.profileRecords = []
+        self.ndof = 0
+        self.edof = None
+        self.nnz = 0
+        self.cancelled = False
+        self.frames = []
 
-    def execute(self):
+    def execute(self, previous=None):
         """
         Method to execute the calculations. The performed calulations are:
         node displacement obtaining, node/element stress and strain obtaining,
         von Misses stress and principal stresses. Also saves the geometry and
         some calculated values to MATLAB files for comparison.
 
+        Parameters
+        ----------
+        TYPE(previous): : tuple, optional
+            DESCRIPTION. (coords, displ) of a similar solved model, which is
+            interpolated to this mesh as start guess of an iterative solver.
+            The default is None.
+
         Returns
         -------
         None.
 
         """
-        E = self.input_data.E
-        v = self.input_data.v
-        ep = [1, self.input_data.t]
-        q = self.input_data.q
-        el_size_factor = self.input_data.el_size_factor
+        self.createModel()
+        with self.stage("load"):
+            f = self.loadVector(self.input_data.q)
+
+        x0 = None
+        if previous is not None:
+            with self.stage("interpolation"):
+                x0 = self.interpolateDisplacements(*previous)
+
+        #-Solves the equation system for the free dofs only, a displacements,
+        #-r reactions forces.
+        a, r = self.solveSystem(f, x0)
+
+        if self.adaptive_tol is not None:
+            a, r = self.adaptMesh(a, r, self.input_data.q)
+
+        self.storeResults(a, r)
+
+    def adaptMesh(self, a, r, q):
+        """
+        Method to refine the mesh where the estimated error is large and
+        solve again, until the relative error in energy norm is below
+        adaptive_tol or adaptive_steps remeshes are made. The new element
+        sizes aim to spread the tolerated error evenly over the elements.
+
+        Parameters
+        ----------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements of the current mesh.
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Reaction forces of the current mesh.
+        TYPE(q): : float
+            DESCRIPTION. The distributed load on the right border.
+
+        Returns
+        -------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements of the final mesh.
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Reaction forces of the final mesh.
+
+        """
+        while True:
+            with self.stage("estimate"):
+                self.estimateError(a)
+
+            if (self.errorEstimate <= self.adaptive_tol or
+                self.adaptations >= self.adaptive_steps):
+                return a, r
+
+            with self.stage("mesh"):
+                self.createMesh(self.refinedSizes())
+            with self.stage("model"):
+                self.applyBoundaryConditions()
+            with self.stage("load"):
+                f = self.loadVector(q)
+
+            a, r = self.solveSystem(f)
+            self.adaptations += 1
+
+    def estimateError(self, a):
+        """
+        Method to estimate the error of a solution by Zienkiewicz-Zhu stress
+        recovery. The element errors and the total are kept relative to the
+        energy norm of the solution, so they don't depend on the load.
+
+        Parameters
+        ----------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements, shape (ndof, 1).
+
+        Returns
+        -------
+        None.
+
+        """
+        ed, es, et = self.computeStresses(a)
+        volume = elm.elementAreas(self.ex, self.ey)*self.ep[1]
+
+        error, norm = elm.zzErrorBatch(es, self.topo, volume, self.D)
 
-        #Construct the geometry
-        geometry = self.input_data.geometry()
+        #Without load there is no error to relate to.
+        total = np.sqrt(np.sum(error**2) + np.sum(norm**2)) or 1.0
+
+        self.elementErrors = error/total
+        self.errorEstimate = float(np.sqrt(np.sum(error**2))/total)
+
+    def refinedSizes(self):
+        """
+        Method to make nodal element sizes of the current mesh for a remesh.
+        An element's size is scaled by the ratio of its tolerated error to
+        its estimated error, which is the convergence rate of linear
+        elements. The ratio is clamped to [1/4, 2], so a size is at most cut
+        to a quarter or doubled per remesh.
+
+        Returns
+        -------
+        TYPE(sizes): : numpy.ndarray
+            DESCRIPTION. The smallest new size of the elements around each
+            node, shape (nnode,).
+
+        """
+        nel, nen = self.topo.shape
+        tolerated = self.adaptive_tol/np.sqrt(nel)
+
+        #Side of an equilateral triangle or a square of the element area.
+        area = elm.elementAreas(self.ex, self.ey)
+        size = np.sqrt(area*(4/np.sqrt(3) if nen == 3 else 1))
+
+        ratio = tolerated/np.maximum(self.elementErrors, 1e-300)
+        size *= np.clip(ratio, 1/4, 2)
+
+        sizes = np.full(self.coords.shape[0], np.inf)
+        np.minimum.at(sizes, self.topo-1, size[:,None])
+
+        return sizes
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Method to profile a stage of the solver as a with block. The wall
+        time, the peak memory allocated through Python (NumPy included, but
+        not GMSH) and the problem size at the end of the stage are appended
+        to the profile of the output data and passed to the stage hook. The
+        memory is only traced if profile is turned on, and it does nothing
+        without profile or a stage hook. A stage raising an error is not
+        recorded.
+
+        Parameters
+        ----------
+        TYPE(name): : str
+            DESCRIPTION. Name of the stage, e.g. "mesh".
+
+        Returns
+        -------
+        None.
+
+        """
+        if not self.profile and self.stage_hook is None:
+            yield
+            return
 
-        el_type = self.input_data.el_type
+        if not self.profile:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+            peak = 0
+        else:
+            #Python before 3.9 can't reset the peak, so tracing is restarted.
+            tracing = tracemalloc.is_tracing()
+            if tracing and hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.stop()
+                tracemalloc.start()
+
+            try:
+                memory = tracemalloc.get_traced_memory()[0]
+                start = time.perf_counter()
+                yield
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1] - memory
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+
+        record = dict(stage=name, time=elapsed, memory=max(peak, 0),
+                      ndof=self.ndof,
+                      nel=0 if self.edof is None else self.edof.shape[0],
+                      nnz=self.nnz)
+        self.profileRecords.append(tuple(record.values()))
+        self.output_data.store(profile=self.profileRecords)
+
+        if self.stage_hook is not None:
+            self.stage_hook(record)
+
+    def clearProfile(self):
+        """
+        Method to start a new profile. Stages are added to the profile until
+        it is cleared, so a parameter study is profiled together with the
+        solve before it.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.profileRecords = []
+        self.output_data.store(profile=None)
+
+    def createModel(self):
+        """
+        Method to construct the geometry, mesh it with GMSH and set up the
+        material, element coordinates and boundary conditions of the model.
+        The results are kept on the solver to be used by the later steps.
+
+        Returns
+        -------
+        None.
+
+        """
+        with self.stage("geometry"):
+            self.createGeometry()
+        with self.stage("mesh"):
+            self.createMesh()
+        with self.stage("model"):
+            self.applyBoundaryConditions()
+
+    def createGeometry(self):
+        """
+        Method to construct the geometry of the model.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.geometry = self.input_data.geometry()
+
+        #The size is unknown until the model is meshed and assembled.
+        self.ndof = 0
+        self.edof = None
+        self.nnz = 0
+
+        #Only estimated by an adaptive solve.
+        self.elementErrors = None
+        self.errorEstimate = None
+        self.adaptations = 0
+
+        self.el_type = self.input_data.el_type
         #Defrees of freedom for node, b.c this is plane strees => 2.
-        dofs_per_node = 2
+        self.dofs_per_node = 2
 
-        #--Makes the mesh using a GMSH mesh generator.
-        mesh = cfm.GmshMeshGenerator(geometry)
-        mesh.el_size_factor = el_size_factor
-        mesh.el_type = el_type
-        mesh.dofs_per_node = dofs_per_node
-        mesh.return_boundary_elements = True
+    def createMesh(self, sizes=None):
+        """
+        Method to mesh the geometry with GMSH, or take the mesh from the mesh
+        cache if it is cached. Meshes made from a size field are not cached.
 
-        coords, edof, dofs, bdofs, elementmarkers, boundaryElements = mesh.create()
+        Parameters
+        ----------
+        TYPE(sizes): : numpy.ndarray, optional
+            DESCRIPTION. Element sizes at the nodes of the current mesh, which
+            replace el_size_factor as a GMSH background field. The default
+            is None.
 
-        #Initialization and prelocation for variabls to perform the calculations
-        D = cfc.hooke(1,E,v)
+        Returns
+        -------
+        None.
+
+        """
+        el_size_factor = self.input_data.el_size_factor
+
+        #--Reuses the mesh if it is cached, otherwise it is made using a GMSH
+        #--mesh generator.
+        cached = None
+        self.meshKey = None
+        if self.mesh_cache is not None and sizes is None:
+            key = self.meshKey = self.mesh_cache.key(self.input_data)
+            cached = self.mesh_cache.get(key)
+
+        if cached is None:
+            import calfem.mesh as cfm #Loads GMSH, so only when meshing.
+
+            mesh = cfm.GmshMeshGenerator(self.geometry)
+            mesh.el_size_factor = el_size_factor
+            mesh.el_type = self.el_type
+            mesh.dofs_per_node = self.dofs_per_node
+            mesh.return_boundary_elements = True
+
+            if sizes is None:
+                coords, edof, dofs, bdofs, elementmarkers, boundaryElements = mesh.create()
+            else:
+                with tempfile.TemporaryDirectory() as directory:
+                    mesh.mesh_dir = directory
+                    mesh.geometry = self.__writeSizeField(mesh, sizes,
+                                                          directory)
+                    mesh.el_size_factor = 1.0 #The sizes are absolute.
+                    coords, edof, dofs, bdofs, elementmarkers, boundaryElements = mesh.create()
+
+            cached = (coords, edof, dofs, bdofs, elementmarkers, mesh.topo)
+            if self.mesh_cache is not None and sizes is None:
+                self.mesh_cache.put(key, cached)
+
+        coords, edof, dofs, bdofs, elementmarkers, topo = cached
+
+        self.coords = coords
+        self.edof = edof
+        self.dofs = dofs
+        self.bdofs = bdofs
+        self.topo = topo
+        self.ndof = np.size(dofs)
+        self.partition = None #Made when a reduced system is assembled.
+        self.mirror = None #Made when results of a half model are stored.
+
+    def __writeSizeField(self, mesh, sizes, directory):
+        """
+        Helpmethod to write the geometry to a .geo file followed by the
+        current mesh as a view of nodal sizes, which GMSH uses as background
+        field instead of the sizes of the geometry points.
+
+        Returns
+        -------
+        TYPE(filename): : str
+            DESCRIPTION. The name of the .geo file.
+
+        """
+        filename = os.path.join(directory, "sizeField.geo")
+
+        nel, nen = self.topo.shape
+        points = np.asarray(self.coords, dtype=float)[self.topo-1,:2]
+        points = np.concatenate([points, np.zeros((nel, nen, 1))], axis=2)
+        data = np.hstack([points.reshape(nel, -1), sizes[self.topo-1]])
+
+        #Scalar triangles or quadrangles with the size at every node.
+        kind = "ST" if nen == 3 else "SQ"
+        fmt = (f"{kind}(" + ",".join(["%.12g"]*3*nen) + "){" +
+               ",".join(["%.12g"]*nen) + "};")
+
+        with open(filename, "w") as mesh.geofile:
+            mesh._writeGeoFile()
+            mesh.geofile.write('View "size" {\n')
+            np.savetxt(mesh.geofile, data, fmt=fmt)
+            mesh.geofile.write("};\n"
+                               "Field[1] = PostView;\n"
+                               "Background Field = 1;\n"
+                               "Mesh.MeshSizeExtendFromBoundary = 0;\n"
+                               "Mesh.MeshSizeFromPoints = 0;\n"
+                               "Mesh.MeshSizeFromCurvature = 0;\n")
+
+        return filename
+
+    def applyBoundaryConditions(self):
+        """
+        Method to set up the material, boundary conditions and element
+        coordinates of the meshed model.
 
-        ndof = np.size(dofs)
-        K = np.zeros((ndof,ndof)) # Stiffness matrix
-        f = np.zeros((ndof,1))      #Force matrix
-        cfu.applyforcetotal(bdofs,f,6,value=q,dimension=1) #Apply q force
+        Returns
+        -------
+        None.
+
+        """
+        E = self.input_data.E
+        v = self.input_data.v
+        self.ep = [1, self.input_data.t]
+
+        #Initialization and prelocation for variabls to perform the calculations
+        self.D = cfc.hooke(1,E,v)
 
-        bc = np.array([],int)
-        bcVal = np.array([],float)
-        bc, bcVal = cfu.applybc(bdofs,bc,bcVal,12,value=0.0,dimension=0)
+        #--The left border is fixed, and the symmetry line of a half model
+        #--can't move across it. All prescribed displacements are zero.
+        bc = [np.asarray(self.bdofs[12], dtype=int)]
+        if self.input_data.symmetric:
+            bc.append(np.asarray(
+                self.bdofs[self.input_data.SYMMETRY_MARKER][1::2], dtype=int))
+        self.bc = np.unique(np.concatenate(bc))
+        self.bcVal = np.zeros(self.bc.size)
 
         # x coordinates and y coordinates for elements
-        ex, ey = cfc.coordxtr(edof, coords, dofs)
+        self.ex, self.ey = elm.coordxtrBatch(self.edof, self.coords, self.dofs)
 
-        #--Loop to create the stiffness matrix
-        for elx, ely, eltopo in zip(ex, ey, edof):
-            if el_type == 2:                     #Case if elements are triangles
-                Ke = cfc.plante(elx, ely, ep, D)
-            elif el_type == 3:                   #Case if elements are quads
-                Ke = cfc.planqe(elx, ely, ep, D)
+    def elementStiffness(self):
+        """
+        Method to create all element stiffness matrices at once.
 
-            # Assemble element stiffness matrices to global stiffness matrix
-            cfc.assem(eltopo, K, Ke)
+        Returns
+        -------
+        TYPE(Kes): : numpy.ndarray
+            DESCRIPTION. Element stiffness matrices, shape (nel, neldof,
+            neldof).
 
-        #-Solves the equation system.
-        a, r = cfc.solveq(K,f, bc, bcVal) #a displacements, #r reactions forces
+        """
+        if self.el_type == 2:                #Case if elements are triangles
+            return elm.planteBatch(self.ex, self.ey, self.ep, self.D)
+        elif self.el_type == 3:              #Case if elements are quads
+            return elm.planqeBatch(self.ex, self.ey, self.ep, self.D)
 
-        ed = cfc.extractEldisp(edof, a) #element displacements
+    def assembleReduced(self):
+        """
+        Method to assemble the element stiffness matrices into the free and
+        prescribed parts of the system. The dof partition is made once per
+        mesh and kept with the cached mesh, so it is reused by later runs.
 
-        #--Computes stresses and strains.
-        if el_type == 2: #Traingle elements
-            es, et = cfc.plants(ex, ey, ep, D, ed) #Stress and strains
+        Returns
+        -------
+        TYPE(Kff): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and columns.
+        TYPE(Kfp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and prescribed columns.
+        TYPE(Kp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Prescribed rows.
 
-        elif el_type == 3: #Quds elements
-            es = np.zeros((edof.shape[0],3))
+        """
+        if self.partition is None and self.mesh_cache is not None:
+            self.partition = self.mesh_cache.getPartition(self.meshKey)
 
-            for i in range(edof.shape[0]):
-                es[i,:], et = cfc.planqs(ex[i,:], ey[i,:], ep, D, ed[i,:])
+        if self.partition is None:
+            self.partition = DofPartition(self.edof, self.bc, self.ndof)
+            if self.mesh_cache is not None:
+                self.mesh_cache.putPartition(self.meshKey, self.partition)
 
-        mises = []      #List of von Misses stress
-        stress1 = []    #List for pricipal stress 1
-        stress2 = []    #List for pricipal stress 2
+        Kff, Kfp, Kp = self.partition.assemble(self.elementStiffness())
+        self.nnz = Kff.nnz + Kfp.nnz + Kp.nnz
 
-        #--Loop to make the vonMisses and principal stresses.
-        for i in range(edof.shape[0]):
+        return Kff, Kfp, Kp
 
-            mises.append(np.sqrt(math.pow(es[i,0],2) - es[i,0]*es[i,1] +
-                        math.pow(es[i,1],2) + 3*es[i,2]))
+    def backend(self):
+        """
+        Method to get the linear solver backend of the input. The "auto"
+        backend is a dense Cholesky factorization for models with at most
+        sparse_limit free dofs, otherwise CHOLMOD if scikit-sparse is
+        installed and else SuperLU.
 
-            theta = np.arctan2(2*es[i,2], es[i,0]-es[i,1])*0.5
+        Returns
+        -------
+        TYPE(backend): : str
+            DESCRIPTION. One of ReducedSystem.BACKENDS except "auto".
 
-            sigma1 = 0.5 * (es[i,0] + es[i,1]) + np.sqrt(np.power(0.5 *
-                    (es[i,0] - es[i,1]), 2) + np.power(es[i,2], 2))
-            sigma2 = 0.5 * (es[i,0] + es[i,1]) + np.sqrt(np.power( 0.5 *
-                    (es[i,0] - es[i,1]), 2) + np.power(es[i,2], 2))
+        """
+        backend = getattr(self.input_data, "solver", "auto")
+        if backend != "auto":
+            return backend
 
-            s1v = [sigma1*np.cos(theta), sigma1*np.sin(theta), 0.0]
-            s2v = [sigma2*np.cos(theta+0.5*np.pi),
-                   sigma2*np.sin(theta+0.5*np.pi), 0.0]
+        if self.partition.nfree <= self.sparse_limit:
+            return "dense"
+        if importlib.util.find_spec("sksparse") is not None:
+            return "cholmod"
+        return "superlu"
 
-            stress1.append(s1v)
-            stress2.append(s2v)
+    def solveSystem(self, f, x0=None):
+        """
+        Method to solve the model for load vectors and record the backend,
+        solve time and residual of the solution in the output data.
 
-        #List for displacments to be used in Paraview.
-        displ = [[np.asscalar(a[i]), np.asscalar(a[i+1]),0.0] for i in range(0,
-                len(a),2)]
+        Parameters
+        ----------
+        TYPE(f): : numpy.ndarray
+            DESCRIPTION. Global load vectors, shape (ndof, nload).
+        TYPE(x0): : numpy.ndarray, optional
+            DESCRIPTION. Start guess of the displacements for an iterative
+            backend, shape (ndof, nload). The default is None.
 
-        eseff = cfc.effmises(es,1) #Makes vonMisses stress using CALFEM.
+        Returns
+        -------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements, shape (ndof, nload).
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Reaction forces, shape (ndof, nload).
+
+        """
+        with self.stage("assembly"):
+            Kff, Kfp, Kp = self.assembleReduced()
+
+        with self.stage("solve"):
+            system = ReducedSystem(Kff, Kfp, Kp, self.partition, self.bcVal,
+                                   backend=self.backend(), rtol=self.rtol)
+            a, r = system.solve(f, x0)
+
+        self.output_data.store(backend=system.backend,
+                               solveTime=system.factorTime+system.solveTime,
+                               residual=system.residual,
+                               iterations=system.iterations)
 
-        eseffnod = cfc.stress2nodal(eseff, edof) #Extracts nodal stresses.
+        return a, r
 
-        #--Save variables to MATLAB files.
+    def interpolateDisplacements(self, coords, displ):
+        """
+        Method to interpolate nodal displacements of another mesh of the
+        model to the nodes of this mesh. Nodes outside the other mesh get the
+        displacement of the closest node.
+
+        Parameters
+        ----------
+        TYPE(coords): : numpy.ndarray
+            DESCRIPTION. Node coordinates of the other mesh, shape (n, 2).
+        TYPE(displ): : numpy.ndarray
+            DESCRIPTION. Nodal displacements of the other mesh, shape (n, 2).
+
+        Returns
+        -------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Interpolated displacements, shape (ndof, 1).
+
+        """
+        from scipy.interpolate import LinearNDInterpolator, NearestNDInterpolator
+
+        values = LinearNDInterpolator(coords, displ)(self.coords)
+
+        outside = np.isnan(values[:,0])
+        if outside.any():
+            values[outside] = NearestNDInterpolator(coords, displ)(
+                self.coords[outside])
+
+        a = np.zeros((self.ndof, 1))
+        a[self.dofs-1, 0] = values
+
+        return a
+
+    def loadVector(self, q):
+        """
+        Method to create the global load vector for a load q on the right
+        border of the bar.
+
+        Parameters
+        ----------
+        TYPE(q): : float
+            DESCRIPTION. The distributed load on the right border.
+
+        Returns
+        -------
+        TYPE(f): : numpy.ndarray
+            DESCRIPTION. The global load vector, shape (ndof, 1).
+
+        """
+        f = np.zeros((self.ndof,1))      #Force matrix
+
+        #x dofs of the right border, where q is spread evenly over the nodes.
+        border = np.asarray(self.bdofs[6][0::2])
+
+        #--On a half model the load is spread over the nodes of the mirrored
+        #--bar, where the node on the symmetry line is shared by the halves
+        #--and gets half of its load in each.
+        if self.input_data.symmetric:
+            line = np.isin(border, self.bdofs[self.input_data.SYMMETRY_MARKER])
+            f[border-1, 0] = np.where(line, 0.5, 1.0)*q/(2*border.size -
+                                                         line.sum())
+            return f
+
+        f[border-1, 0] = q/border.size #Apply q force
+
+        return f
+
+    def computeStresses(self, a):
+        """
+        Method to compute element displacements, stresses and strains from a
+        solution.
+
+        Parameters
+        ----------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements, shape (ndof, 1).
+
+        Returns
+        -------
+        TYPE(ed): : numpy.ndarray
+            DESCRIPTION. Element displacements, shape (nel, neldof).
+        TYPE(es): : numpy.ndarray
+            DESCRIPTION. Element stresses [sigx, sigy, tauxy], shape (nel, 3).
+        TYPE(et): : numpy.ndarray
+            DESCRIPTION. Element strains [epsx, epsy, gamxy], shape (nel, 3).
+
+        """
+        edof = self.edof
+        ex = self.ex
+        ey = self.ey
+        ep = self.ep
+        D = self.D
+
+        ed = a[edof-1, 0] #element displacements
+
+        #--Computes stresses and strains for all elements at once.
+        if self.el_type == 2: #Traingle elements
+            es, et = elm.plantsBatch(ex, ey, ep, D, ed) #Stress and strains
+
+        elif self.el_type == 3: #Quds elements
+            es, et = elm.planqsBatch(ex, ey, ep, D, ed)
+
+        return ed, es, et
+
+    def storeResults(self, a, r, ed=None, es=None, et=None):
+        """
+        Method to compute von Misses and principal stresses from a solution
+        and transfer them together with the model to the output data. The
+        element displacements, stresses and strains are computed from a if
+        they are not given.
+
+        Parameters
+        ----------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements, shape (ndof, 1).
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Reaction forces, shape (ndof, 1).
+        TYPE(ed): : numpy.ndarray, optional
+            DESCRIPTION. Element displacements. The default is None.
+        TYPE(es): : numpy.ndarray, optional
+            DESCRIPTION. Element stresses. The default is None.
+        TYPE(et): : numpy.ndarray, optional
+            DESCRIPTION. Element strains. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        if ed is None:
+            with self.stage("stresses"):
+                ed, es, et = self.computeStresses(a)
+
+        mesh = self
+        error = self.elementErrors
+
+        #--A half model is mirrored to the full bar.
+        if self.input_data.symmetric:
+            with self.stage("mirror"):
+                if self.mirror is None:
+                    self.mirror = MirroredMesh(
+                        self.coords, self.dofs, self.topo, self.bdofs,
+                        self.input_data.h, self.input_data.geometry(half=False))
+                mesh = self.mirror
+                a, r = mesh.displacements(a), mesh.forces(r)
+                ed = a[mesh.edof-1, 0]
+                es, et = mesh.elements(es, shear=2), mesh.elements(et, shear=2)
+                if error is not None:
+                    error = mesh.elements(error)
+
+        with self.stage("postprocess"):
+            self.__postprocess(a, r, ed, es, et, mesh, error)
+
+        #--Save all results to one archive per run, e.g. to compare in MATLAB.
         if self.mat_save:
-            scio.savemat('MATLABSaves/geometry.mat', dict(geometry=geometry))
-            scio.savemat('MATLABSaves/coords.mat', dict(coords=coords))
-            scio.savemat('MATLABSaves/dofs.mat', dict(dofs=dofs))
-            scio.savemat('MATLABSaves/edof.mat', dict(edof=edof))
-            scio.savemat('MATLABSaves/bc.mat', dict(bc=bc))
-            scio.savemat('MATLABSaves/a_python.mat', dict(a_python=a))
-            scio.savemat('MATLABSaves/r_python.mat', dict(r_python=r))
-            scio.savemat('MATLABSaves/ed_python.mat', dict(ed_python=ed))
-            scio.savemat('MATLABSaves/es_python.mat', dict(es_python=es))
-
-
-        #--Transfer model variables to local variables
-        self.output_data.a = a
-        self.output_data.r = r
-        self.output_data.ed = ed
-        self.output_data.es = es
-        self.output_data.et = et
-        self.output_data.ex = ex
-        self.output_data.ey = ey
-        self.output_data.coords = coords
-        self.output_data.edof = edof
-        self.output_data.dofs = dofs
-        self.output_data.geometry = geometry
-        self.output_data.dofsPerNode = dofs_per_node
-        self.output_data.elType = el_type
-        self.output_data.eseff = eseff
-        self.output_data.maxEssef = np.amax(eseff)
-        self.output_data.eseffnod = eseffnod
-        self.output_data.topo = mesh.topo
-        self.output_data.mises = mises
-        self.output_data.stress1 = stress1
-        self.output_data.stress2 = stress2
-        self.output_data.displ = displ
+            with self.stage("export mat"):
+                self.output_data.save(self.archiveFilename())
+
+    def __postprocess(self, a, r, ed, es, et, mesh, error):
+        """
+        Helpmethod to compute the stress measures of a solution and store
+        them with the model in the output data. The mesh is the solver or
+        the mirrored mesh of a half model.
+
+        """
+        edof = mesh.edof
+        ex = mesh.ex
+        ey = mesh.ey
+        el_type = self.el_type
+
+        #--Makes the von Misses and principal stresses for all elements.
+        mises, stress1, stress2 = elm.stressMeasures(es)
+
+        #Nodal displacement vectors to be used in Paraview.
+        displ = np.zeros((mesh.coords.shape[0], 3))
+        displ[:,:2] = a[mesh.dofs-1, 0]
+
+        eseff = cfc.effmises(es,1) #Makes vonMisses stress using CALFEM.
+
+        eseffnod = elm.stress2nodalBatch(eseff, edof) #Extracts nodal stresses.
+
+        #--Transfer model variables to the output data as typed arrays.
+        self.output_data.store(a=a, r=r, ed=ed, es=es, et=et, ex=ex, ey=ey,
+                               coords=mesh.coords, displ=displ, edof=edof,
+                               dofs=mesh.dofs, bc=mesh.bc, topo=mesh.topo,
+                               eseff=eseff, eseffnod=eseffnod, mises=mises,
+                               stress1=stress1, stress2=stress2,
+                               geometry=mesh.geometry,
+                               dofsPerNode=self.dofs_per_node,
+                               elType=el_type,
+                               maxEssef=float(np.amax(eseff)),
+                               error=error,
+                               errorEstimate=self.errorEstimate,
+                               adaptations=self.adaptations,
+                               inputKey=self.input_data.key())
+
+    def archiveFilename(self, extension=".mat"):
+        """
+        Method to make a new name of a result archive in MATLABSaves, named
+        by the time of the run so earlier runs are kept.
+
+        Parameters
+        ----------
+        TYPE(extension): : str, optional
+            DESCRIPTION. The extension, ".mat" or ".npz". The default is
+            ".mat".
+
+        Returns
+        -------
+        TYPE(filename): : str
+            DESCRIPTION. The name of the archive.
+
+        """
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join("MATLABSaves", f"results_{stamp}{extension}")
 
     def executeParamStudy(self):
         """
-        Method to perform a parameter study.
+        Method to perform a parameter study. The study stops after the step
+        in progress if it is cancelled, and the exported files are listed in
+        frames.
 
         Returns
         -------
@@ -196,6 +871,7 @@ class Solver():
         """
         old_b = self.input_data.b
         old_q = self.input_data.q
+        self.frames = []
 
         #Trigger if the user want a parameter study on b.
         if self.input_data.paramb:
@@ -203,18 +879,31 @@ class Solver():
             bRange = np.linspace(self.input_data.bstart, self.input_data.bend,
                                  self.input_data.paramSteps)
 
+            filenames = self.paramFilenames("bParam/paramStudy_01",
+                                            len(bRange))
+
             # --- Starts the parameter study of b.
-            #counter to make resonable file names.
-            for counter, b in enumerate(bRange):
-                self.input_data.b = b
-                self.execute()
+            #The steps are independent, so they can be spread over processes.
+            if self.workers > 1:
+                self.executeParallel(bRange, filenames)
+            else:
+                #Neighbouring steps have similar displacements, so an
+                #iterative solver starts from the previous step.
+                previous = None
+                for b, filename in zip(bRange, filenames):
+                    if self.cancelled:
+                        break
 
-                # --- Exports to vtk-file
-                #Special case if <10 or have 0 infront.
-                if counter < 9:
-                    self.exportVtk(f"vtks/bParam/paramStudy_01_0{counter+1}.vtk")
-                else:
-                    self.exportVtk(f"vtks/bParam/paramStudy_01_{counter+1}.vtk")
+                    self.input_data.b = b
+                    self.execute(previous)
+
+                    if self.warm_start and self.output_data.backend == "pcg":
+                        previous = (self.output_data.coords,
+                                    self.output_data.displ[:,:2])
+
+                    # --- Exports to vtk-file
+                    self.exportVtk(filename)
+                    self.frameDone(filename, len(bRange))
 
         #Trigger if the user want a parameter study on b.
         elif self.input_data.paramq:
@@ -222,26 +911,220 @@ class Solver():
             qRange = np.linspace(self.input_data.qstart, self.input_data.qend,
                                  self.input_data.paramSteps)
 
+            #The model is linear in q, so a unit load solution is scaled to
+            #every step without any further solves.
+            #The relative error doesn't depend on q, so an adapted mesh is
+            #made once for a unit load.
+            if self.superpose:
+                self.createModel()
+                a1, r1 = self.solveSystem(self.loadVector(1.0))
+                if self.adaptive_tol is not None:
+                    a1, r1 = self.adaptMesh(a1, r1, 1.0)
+                ed1, es1, et1 = self.computeStresses(a1)
+
+            #Only the load changes, so the model is meshed, assembled and
+            #factorized once and all load cases are solved together.
+            elif self.factorize_once:
+                self.createModel()
+                if self.adaptive_tol is not None:
+                    self.adaptMesh(*self.solveSystem(self.loadVector(1.0)),
+                                   1.0)
+                F = np.hstack([self.loadVector(q) for q in qRange])
+                A, R = self.solveSystem(F)
+
+            filenames = self.paramFilenames("qParam/paramStudy_02",
+                                            len(qRange))
+
+            #The mesh is the same for all q, so it is only stored once.
+            series = None
+
             # --- Starts the parameter study of q.
             for counter,q in enumerate(qRange):
+                if self.cancelled:
+                    break
 
                 self.input_data.q = q
-                self.execute()
+                if self.superpose:
+                    self.storeResults(q*a1, q*r1, q*ed1, q*es1, q*et1)
+                elif self.factorize_once:
+                    self.storeResults(A[:,[counter]], R[:,[counter]])
+                else:
+                    self.execute()
 
                 # --- Exports to vtk-file
-                #Special case if <10 or have 0 infront.
-                if counter < 9:
-                    self.exportVtk(f"vtks/qParam/paramStudy_02_0{counter+1}.vtk")
+                if self.vtk_format == "xdmf":
+                    with self.stage("export"):
+                        if series is None:
+                            series = vtf.XdmfSeries(
+                                os.path.join(self.vtk_dir,
+                                             "qParam/paramStudy_02.xdmf"),
+                                self.output_data.coords,
+                                self.output_data.topo,
+                                self.output_data.elType)
+                        series.addStep(counter, *self.fieldData())
+                    self.frameDone(series.filename, len(qRange))
                 else:
-                    self.exportVtk(f"vtks/qParam/paramStudy_02_{counter+1}.vtk")
+                    self.exportVtk(filenames[counter])
+                    self.frameDone(filenames[counter], len(qRange))
+
+            if series is not None:
+                series.close()
+
+        #Indexes the frames of the study in a ParaView collection.
+        if self.vtk_format in ("vtu", "xdmf") and (self.input_data.paramb or
+            (self.input_data.paramq and self.vtk_format == "vtu")):
+            vtf.writePvd(filenames[0].rsplit("_", 1)[0] + ".pvd",
+                         [filename for filename in filenames
+                          if filename in self.frames])
 
         # --- Restores parameters to pre parameter study.
         self.input_data.b = old_b
         self.input_data.q = old_q
 
+    def paramFilenames(self, base, steps):
+        """
+        Method to make the names of the exported files of a parameter study.
+        The step number is appended with two digits and the extension follows
+        the export format.
+
+        Parameters
+        ----------
+        TYPE(base): : str
+            DESCRIPTION. Start of the file names relative to the export
+            directory, e.g. "bParam/paramStudy_01".
+        TYPE(steps): : int
+            DESCRIPTION. Number of steps in the study.
+
+        Returns
+        -------
+        TYPE(filenames): : list
+            DESCRIPTION. File name for each step.
+
+        """
+        extension = ".vtk" if self.vtk_format == "vtk" else ".vtu"
+
+        base = os.path.join(self.vtk_dir, base)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+        #Special case if <10 or have 0 infront.
+        return [f"{base}_{counter+1:02d}{extension}" for counter in range(steps)]
+
+    def frameDone(self, filename, steps):
+        """
+        Method to record an exported step of a parameter study and report it
+        to the progress function.
+
+        Parameters
+        ----------
+        TYPE(filename): : str
+            DESCRIPTION. Name of the exported file.
+        TYPE(steps): : int
+            DESCRIPTION. Number of steps in the study.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.frames.append(filename)
+
+        if self.progress is not None:
+            self.progress(len(self.frames), steps, filename)
+
+    def cancel(self):
+        """
+        Method to stop a running parameter study after the step in progress.
+        It is safe to call from another thread. The flag is kept until it is
+        reset, so a new study has to set cancelled to False.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.cancelled = True
+
+    def executeParallel(self, bRange, filenames):
+        """
+        Method to perform a parameter study on b with a pool of processes.
+        Every step is meshed, solved, exported and archived by a worker with
+        its own copy of the input data. The output data is updated with the
+        last finished step as in a serial study, also if it is cancelled.
+
+        Parameters
+        ----------
+        TYPE(bRange): : numpy.ndarray
+            DESCRIPTION. The values of b to do calculations on.
+        TYPE(filenames): : list
+            DESCRIPTION. Name of the .vtk file to export for each b.
+
+        Returns
+        -------
+        None.
+
+        """
+        output_data = None
+        latest = -1
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(executeStep, self.input_data, b,
+                                       filename, self.options(),
+                                       self.mat_save): counter
+                       for counter, (b, filename) in enumerate(zip(bRange,
+                                                                   filenames))}
+
+            #Raises any error from the workers and keeps the result of the
+            #latest step. Steps are reported as they finish, which may be
+            #out of order.
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+
+                result = future.result()
+                counter = futures[future]
+                if counter > latest:
+                    output_data, latest = result, counter
+
+                self.frameDone(filenames[counter], len(bRange))
+
+                #Steps not yet started are dropped, running steps finish.
+                if self.cancelled:
+                    for pending in futures:
+                        pending.cancel()
+
+        #The profile has the stages of this process, not of the workers.
+        if output_data is not None:
+            output_data.profile = self.output_data.profile
+            self.output_data.update(output_data)
+
+    def options(self):
+        """
+        Method to get the solver settings as keyword arguments, so an equal
+        solver can be made for other input and output data.
+
+        Returns
+        -------
+        TYPE(options): : dict
+            DESCRIPTION. Keyword arguments of the constructor except mat_save.
+
+        """
+        return dict(sparse_limit=self.sparse_limit,
+                    factorize_once=self.factorize_once,
+                    superpose=self.superpose,
+                    workers=self.workers,
+                    vtk_format=self.vtk_format,
+                    vtk_compress=self.vtk_compress,
+                    mesh_cache=self.mesh_cache,
+                    vtk_dir=self.vtk_dir,
+                    warm_start=self.warm_start,
+                    rtol=self.rtol,
+                    adaptive_tol=self.adaptive_tol,
+                    adaptive_steps=self.adaptive_steps)
+
     def exportVtk(self, filename):
         """
-        Method to export the parameter study to a .vtk file.
+        Method to export the parameter study to a .vtk file, or a binary
+        .vtu file if that is the export format of the solver.
 
         Parameters
         ----------
@@ -253,22 +1136,590 @@ class Solver():
         None.
 
         """
+        with self.stage("export"):
+            if self.vtk_format in ("vtu", "xdmf"):
+                self.exportVtu(filename)
+            else:
+                self.__exportLegacyVtk(filename)
+
+    def __exportLegacyVtk(self, filename):
+        """
+        Helpmethod to export the results to a legacy ascii .vtk file.
+
+        """
+        import pyvtk as vtk
+
         #Convert displacement to vtk point data.
         point_data = vtk.PointData(vtk.Vectors(self.output_data.displ,
                                                name="displacements"))
 
         # --- Makes points, polygons, celldata and structure for the .vtk format
+        #pyvtk takes the arrays of the fields, but the structure as lists.
         points = self.output_data.coords.tolist()
         polygons = (self.output_data.topo-1).tolist()
-        cellData = vtk.CellData(vtk.Scalars(self.output_data.mises,
-                                            name="mises"),
-                                vtk.Vectors(self.output_data.stress1,
-                                            "principal stress 1"),
-                                vtk.Vectors(self.output_data.stress2,
-                                            "principal stress 2"))
+        cellFields = [vtk.Scalars(self.output_data.mises, name="mises"),
+                      vtk.Vectors(self.output_data.stress1,
+                                  "principal stress 1"),
+                      vtk.Vectors(self.output_data.stress2,
+                                  "principal stress 2")]
+        if self.output_data.error is not None:
+            cellFields.append(vtk.Scalars(self.output_data.error,
+                                          name="error"))
+        cellData = vtk.CellData(*cellFields)
         structure = vtk.PolyData(points = points, polygons = polygons)
 
         #Makes the above for a .vtk data.
         vtkData = vtk.VtkData(structure, cellData, point_data)
 
         vtkData.tofile(filename, "ascii")#Saves the file using vtkDatas function
+
+    def exportVtu(self, filename):
+        """
+        Method to export the results to a binary VTK XML .vtu file. The arrays
+        are written directly from the output data without list conversion.
+
+        Parameters
+        ----------
+        TYPE(filename): : str
+            DESCRIPTION. Name of the .vtu file to export.
+
+        Returns
+        -------
+        None.
+
+        """
+        point_data, cell_data = self.fieldData()
+
+        vtf.writeVtu(filename, self.output_data.coords, self.output_data.topo,
+                     self.output_data.elType, point_data, cell_data,
+                     compress=self.vtk_compress)
+
+    def fieldData(self):
+        """
+        Method to collect the exported point and cell fields of the output
+        data.
+
+        Returns
+        -------
+        TYPE(point_data): : dict
+            DESCRIPTION. Nodal displacements as 3D vectors.
+        TYPE(cell_data): : dict
+            DESCRIPTION. Von Misses stress and the principal stress vectors.
+
+        """
+        point_data = {"displacements": self.output_data.displ}
+        cell_data = {"mises": self.output_data.mises,
+                     "principal stress 1": self.output_data.stress1,
+                     "principal stress 2": self.output_data.stress2}
+        if self.output_data.error is not None:
+            cell_data["error"] = self.output_data.error
+
+        return point_data, cell_data
+
+
+def executeStep(input_data, b, filename, options, mat_save):
+    """
+    Function to solve and export one step of a parameter study on b. It is
+    used by the worker processes of Solver.executeParallel.
+
+    Parameters
+    ----------
+    TYPE(input_data): : dataTypes.InputData
+        DESCRIPTION. The input data of the study, copied to the worker.
+    TYPE(b): : float
+        DESCRIPTION. The value of b for this step.
+    TYPE(filename): : str
+        DESCRIPTION. Name of the .vtk file to export.
+    TYPE(options): : dict
+        DESCRIPTION. Keyword arguments for the solver, see Solver.options.
+    TYPE(mat_save): : bool
+        DESCRIPTION. Boolean to controll if the result is saved to MATLAB data.
+
+    Returns
+    -------
+    TYPE(output_data): : dataTypes.OutputData
+        DESCRIPTION. The output data of the step.
+
+    """
+    input_data = copy.deepcopy(input_data)
+    input_data.b = b
+    output_data = OutputData()
+
+    solver = Solver(input_data, output_data, mat_save=mat_save, **options)
+    solver.execute()
+    solver.exportVtk(filename)
+
+    return output_data
+
+class MirroredMesh():
+    """
+    Class to mirror the mesh of the lower half of a bar that is symmetric
+    about its mid-line y = h/2, and map results of the half to the full bar.
+    Nodes on the symmetry line are shared by the halves, the mirrored nodes
+    and elements follow after those of the half.
+    """
+
+    def __init__(self, coords, dofs, topo, bdofs, h, geometry):
+        """
+        Constructor for the mirrored mesh.
+
+        Parameters
+        ----------
+        TYPE(coords): : numpy.ndarray
+            DESCRIPTION. Node coordinates of the half, shape (nnode, 2).
+        TYPE(dofs): : numpy.ndarray
+            DESCRIPTION. Node dofs (1-based) of the half, shape (nnode, 2).
+        TYPE(topo): : numpy.ndarray
+            DESCRIPTION. Element nodes (1-based) of the half, shape
+            (nel, nen).
+        TYPE(bdofs): : dict
+            DESCRIPTION. Border dofs of the half by marker, with the wall
+            marked 12 and the symmetry line InputData.SYMMETRY_MARKER.
+        TYPE(h): : float
+            DESCRIPTION. Height of the full bar.
+        TYPE(geometry): : calfem.geometry.Geometry
+            DESCRIPTION. Geometry of the full bar.
+
+        Returns
+        -------
+        None.
+
+        """
+        from dataTypes import InputData
+
+        coords = np.asarray(coords, dtype=float)
+        dofs = np.asarray(dofs, dtype=np.int64)
+        topo = np.asarray(topo, dtype=np.int64)
+        nnode = coords.shape[0]
+
+        #Node of every x dof of the half.
+        node = np.zeros(dofs.max(), dtype=np.int64)
+        node[dofs[:,0]-1] = np.arange(nnode)
+
+        def borderNodes(marker):
+            return node[np.asarray(bdofs[marker], dtype=np.int64)[0::2]-1]
+
+        self.halfDofs = dofs
+        self.line = np.zeros(nnode, dtype=bool)
+        self.line[borderNodes(InputData.SYMMETRY_MARKER)] = True
+        mirrored = ~self.line
+        self.mirrored = mirrored
+
+        #Node of the full bar that each node of the half is mirrored to.
+        image = np.arange(nnode)
+        image[mirrored] = nnode + np.arange(mirrored.sum())
+
+        mirror = coords[mirrored].copy()
+        mirror[:,1] = h - mirror[:,1]
+        self.coords = np.vstack([coords, mirror])
+
+        #Mirroring turns the elements, so their node order is reversed.
+        self.topo = np.vstack([topo, image[topo-1][:,::-1] + 1])
+        self.dofs = np.arange(1, 2*self.coords.shape[0]+1).reshape(-1, 2)
+        self.edof = self.dofs[self.topo-1].reshape(self.topo.shape[0], -1)
+        self.ex, self.ey = elm.coordxtrBatch(self.edof, self.coords,
+                                             self.dofs)
+
+        wall = borderNodes(12)
+        self.bc = np.sort(self.dofs[np.union1d(wall, image[wall])].ravel())
+        self.geometry = geometry
+
+    def displacements(self, a):
+        """
+        Method to mirror nodal displacements of the half, y is turned.
+
+        Parameters
+        ----------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Displacements of the half, shape (ndof, ncol).
+
+        Returns
+        -------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Displacements of the full bar.
+
+        """
+        nodal = a[self.halfDofs-1]                  #(nnode, 2, ncol)
+        mirror = nodal[self.mirrored]*np.array([1, -1])[:,None]
+
+        return np.concatenate([nodal, mirror]).reshape(-1, a.shape[1])
+
+    def forces(self, r):
+        """
+        Method to mirror nodal forces of the half, y is turned. The force
+        on a node of the symmetry line is the sum of both halves, so x is
+        doubled and y cancels.
+
+        Parameters
+        ----------
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Forces of the half, shape (ndof, ncol).
+
+        Returns
+        -------
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Forces of the full bar.
+
+        """
+        nodal = r[self.halfDofs-1]                  #(nnode, 2, ncol)
+        mirror = nodal[self.mirrored]*np.array([1, -1])[:,None]
+
+        nodal = nodal.copy()
+        nodal[self.line] *= np.array([2, 0])[:,None]
+
+        return np.concatenate([nodal, mirror]).reshape(-1, r.shape[1])
+
+    def elements(self, values, shear=None):
+        """
+        Method to mirror element values of the half.
+
+        Parameters
+        ----------
+        TYPE(values): : numpy.ndarray
+            DESCRIPTION. Values of the half, shape (nel,) or (nel, ncomp).
+        TYPE(shear): : int, optional
+            DESCRIPTION. Column of a shear component, which is turned. The
+            default is None.
+
+        Returns
+        -------
+        TYPE(values): : numpy.ndarray
+            DESCRIPTION. Values of the full bar.
+
+        """
+        mirror = np.array(values, dtype=float)
+        if shear is not None:
+            mirror[:,shear] *= -1
+
+        return np.concatenate([values, mirror])
+
+class DofPartition():
+    """
+    Class to hold the split of the dofs of a mesh into free and prescribed
+    dofs. The sparsity patterns of the free, the free-prescribed and the
+    prescribed rows blocks of the stiffness matrix are computed once, with the
+    position of every element matrix entry, so assembling the blocks is only
+    a sum of the entries.
+    """
+
+    def __init__(self, edof, bc, ndof):
+        """
+        Constructor for the partition.
+
+        Parameters
+        ----------
+        TYPE(edof): : numpy.ndarray
+            DESCRIPTION. Element topology with 1-based dofs, shape
+            (nel, neldof).
+        TYPE(bc): : numpy.ndarray
+            DESCRIPTION. 1-based prescribed dofs.
+        TYPE(ndof): : int
+            DESCRIPTION. Total number of degrees of freedom.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.ndof = ndof
+        self.bc = np.asarray(bc, dtype=np.int64) - 1
+        self.prescribed = np.unique(self.bc)
+
+        self.free = np.ones(ndof, dtype=bool)
+        self.free[self.prescribed] = False
+        self.nfree = int(np.count_nonzero(self.free))
+
+        #Position of each dof in the free and prescribed blocks, -1 if none.
+        freeIndex = np.full(ndof, -1, dtype=np.int64)
+        freeIndex[self.free] = np.arange(self.nfree)
+        prescribedIndex = np.full(ndof, -1, dtype=np.int64)
+        prescribedIndex[self.prescribed] = np.arange(self.prescribed.size)
+
+        rows, cols = elm.scatterIndices(edof)
+        freeRows = freeIndex[rows]
+        freeCols = freeIndex[cols]
+        prescribedRows = prescribedIndex[rows]
+        prescribedCols = prescribedIndex[cols]
+
+        ff = (freeRows >= 0) & (freeCols >= 0)
+        fp = (freeRows >= 0) & (prescribedCols >= 0)
+        p = prescribedRows >= 0
+
+        self.blocks = [self.__pattern(np.flatnonzero(mask), blockRows,
+                                      blockCols, shape)
+                       for mask, blockRows, blockCols, shape in
+                       ((ff, freeRows[ff], freeCols[ff],
+                         (self.nfree, self.nfree)),
+                        (fp, freeRows[fp], prescribedCols[fp],
+                         (self.nfree, self.prescribed.size)),
+                        (p, prescribedRows[p], cols[p],
+                         (self.prescribed.size, ndof)))]
+
+    def __pattern(self, entries, rows, cols, shape):
+        """
+        Helpmethod to make the CSR pattern of a block and the position in it
+        of the element matrix entries that belong to the block.
+
+        Returns
+        -------
+        TYPE(pattern): : tuple
+            DESCRIPTION. (entries, positions, indices, indptr, shape).
+
+        """
+        keys, positions = np.unique(rows*shape[1] + cols, return_inverse=True)
+
+        indices = keys % shape[1]
+        counts = np.bincount(keys // shape[1], minlength=shape[0])
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        return entries, positions.ravel(), indices, indptr, shape
+
+    def prescribedValues(self, bcVal):
+        """
+        Method to order values of the prescribed dofs as in the partition.
+
+        Parameters
+        ----------
+        TYPE(bcVal): : numpy.ndarray
+            DESCRIPTION. Values of the prescribed dofs, in the order of bc.
+
+        Returns
+        -------
+        TYPE(values): : numpy.ndarray
+            DESCRIPTION. Values of the sorted prescribed dofs.
+
+        """
+        values = np.zeros(self.prescribed.size)
+        values[np.searchsorted(self.prescribed, self.bc)] = bcVal
+
+        return values
+
+    def assemble(self, Kes):
+        """
+        Method to assemble element stiffness matrices to the blocks of the
+        stiffness matrix.
+
+        Parameters
+        ----------
+        TYPE(Kes): : numpy.ndarray
+            DESCRIPTION. Element stiffness matrices, shape (nel, neldof,
+            neldof).
+
+        Returns
+        -------
+        TYPE(Kff): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and columns, shape (nfree, nfree).
+        TYPE(Kfp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and prescribed columns, shape
+            (nfree, nprescribed).
+        TYPE(Kp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Prescribed rows, shape (nprescribed, ndof).
+
+        """
+        values = np.asarray(Kes, dtype=float).ravel()
+
+        return tuple(sp.csr_matrix((np.bincount(positions,
+                                                weights=values[entries],
+                                                minlength=indices.size),
+                                    indices, indptr), shape=shape)
+                     for entries, positions, indices, indptr, shape
+                     in self.blocks)
+
+class ReducedSystem():
+    """
+    Class to hold a stiffness matrix partitioned into free and prescribed dofs
+    where the free part is factorized once. The factorization can then be
+    reused to solve for any number of load vectors.
+    """
+
+    #Linear solver backends for the free dofs.
+    BACKENDS = ("auto", "dense", "superlu", "cholmod", "pcg")
+
+    def __init__(self, Kff, Kfp, Kp, partition, bcVal, backend="superlu",
+                 rtol=1e-10):
+        """
+        Constructor for the reduced system. Factorizes the free part with the
+        chosen backend, which is timed.
+
+        Parameters
+        ----------
+        TYPE(Kff): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and columns, shape (nfree, nfree).
+        TYPE(Kfp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Free rows and prescribed columns.
+        TYPE(Kp): : scipy.sparse.csr_matrix
+            DESCRIPTION. Prescribed rows, shape (nprescribed, ndof).
+        TYPE(partition): : solvers.DofPartition
+            DESCRIPTION. The dof partition of the mesh.
+        TYPE(bcVal): : numpy.ndarray
+            DESCRIPTION. Values of the prescribed dofs, in the order of bc.
+        TYPE(backend): : str, optional
+            DESCRIPTION. "dense" for a dense Cholesky factorization (LAPACK),
+            "superlu" for a sparse LU factorization, "cholmod" for a sparse
+            Cholesky factorization, which needs scikit-sparse, or "pcg" for
+            the Jacobi preconditioned conjugate gradient method. The default
+            is "superlu".
+        TYPE(rtol): : float, optional
+            DESCRIPTION. Relative residual the conjugate gradient method
+            iterates to. The default is 1e-10.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.partition = partition
+        self.Kff = Kff
+        self.Kfp = Kfp
+        self.Kp = Kp
+        self.backend = backend
+        self.rtol = rtol
+        self.iterations = 0
+        self.solveTime = 0.0
+        self.residual = None
+
+        self.bcVal = partition.prescribedValues(bcVal)
+
+        start = time.perf_counter()
+
+        if backend == "dense":
+            self.cho = scl.cho_factor(Kff.toarray())
+        elif backend == "superlu":
+            self.lu = spla.splu(Kff.tocsc())
+        elif backend == "cholmod":
+            try:
+                from sksparse.cholmod import cholesky
+            except ImportError:
+                raise ImportError("The cholmod backend needs scikit-sparse, "
+                                  "use superlu instead.") from None
+            self.factor = cholesky(Kff.tocsc())
+        elif backend == "pcg":
+            self.diagonal = Kff.diagonal()
+        else:
+            raise ValueError(f"Unknown solver backend {backend}, choose one "
+                             f"of {', '.join(self.BACKENDS)}.")
+
+        self.factorTime = time.perf_counter() - start
+
+    def solve(self, f, x0=None):
+        """
+        Method to solve the system for one or several load vectors using the
+        stored factorization. The time and the largest relative residual of
+        the free dofs are kept in solveTime and residual.
+
+        Parameters
+        ----------
+        TYPE(f): : numpy.ndarray
+            DESCRIPTION. Global load vectors, shape (ndof, nload).
+        TYPE(x0): : numpy.ndarray, optional
+            DESCRIPTION. Start guess of the displacements, shape (ndof,
+            nload), only used by the pcg backend. The default is None.
+
+        Returns
+        -------
+        TYPE(a): : numpy.ndarray
+            DESCRIPTION. Nodal displacements, shape (ndof, nload).
+        TYPE(r): : numpy.ndarray
+            DESCRIPTION. Reaction forces, shape (ndof, nload). They are only
+            computed for the prescribed dofs and are zero for the free dofs.
+
+        """
+        free = self.partition.free
+        prescribed = self.partition.prescribed
+        nload = f.shape[1]
+
+        a = np.zeros((self.partition.ndof, nload))
+        a[prescribed,:] = self.bcVal[:,None]
+
+        fsys = f[free,:] - self.Kfp @ a[prescribed,:]
+
+        start = time.perf_counter()
+
+        if self.backend == "dense":
+            a[free,:] = scl.cho_solve(self.cho, fsys)
+        elif self.backend == "superlu":
+            a[free,:] = self.lu.solve(fsys)
+        elif self.backend == "cholmod":
+            a[free,:] = self.factor(fsys)
+        else:
+            guess = None if x0 is None else x0[free,:]
+            a[free,:], self.iterations = pcg(self.Kff, fsys, self.diagonal,
+                                             guess, rtol=self.rtol)
+
+        self.solveTime = time.perf_counter() - start
+
+        #Relative residual of the free dofs, for zero loads the absolute.
+        norms = np.linalg.norm(fsys, axis=0)
+        norms[norms == 0] = 1.0
+        self.residual = float(np.max(np.linalg.norm(
+            self.Kff @ a[free,:] - fsys, axis=0) / norms))
+
+        #Reactions from the prescribed rows.
+        r = np.zeros((self.partition.ndof, nload))
+        r[prescribed,:] = self.Kp @ a - f[prescribed,:]
+
+        return a, r
+
+def pcg(A, b, diagonal, x0=None, rtol=1e-10, maxiter=None):
+    """
+    Function to solve a symmetric positive definite system with the conjugate
+    gradient method and a Jacobi (diagonal) preconditioner. Several right hand
+    sides are solved together, each with its own step lengths.
+
+    Parameters
+    ----------
+    TYPE(A): : scipy.sparse.csr_matrix
+        DESCRIPTION. The system matrix, shape (n, n).
+    TYPE(b): : numpy.ndarray
+        DESCRIPTION. Right hand sides, shape (n, nrhs).
+    TYPE(diagonal): : numpy.ndarray
+        DESCRIPTION. The diagonal of A, shape (n,).
+    TYPE(x0): : numpy.ndarray, optional
+        DESCRIPTION. Start guess, shape (n, nrhs). The default is None (zero).
+    TYPE(rtol): : float, optional
+        DESCRIPTION. Relative residual to iterate to. The default is 1e-10.
+    TYPE(maxiter): : int, optional
+        DESCRIPTION. Maximum number of iterations. The default is None
+        (10*n).
+
+    Returns
+    -------
+    TYPE(x): : numpy.ndarray
+        DESCRIPTION. The solutions, shape (n, nrhs).
+    TYPE(iterations): : int
+        DESCRIPTION. Number of iterations until all solutions converged.
+
+    """
+    maxiter = maxiter or 10*b.shape[0]
+
+    x = np.zeros_like(b) if x0 is None else np.array(x0, dtype=float)
+    r = b - A @ x
+    z = r / diagonal[:,None]
+    p = z.copy()
+    rz = np.sum(r*z, axis=0)
+
+    tolerance = rtol*np.linalg.norm(b, axis=0)
+
+    for iteration in range(maxiter + 1):
+        done = np.linalg.norm(r, axis=0) <= tolerance
+        if done.all():
+            return x, iteration
+
+        #Converged right hand sides are kept by zero step lengths.
+        Ap = A @ p
+        alpha = np.zeros_like(rz)
+        np.divide(rz, np.sum(p*Ap, axis=0), out=alpha, where=~done)
+
+        x += alpha*p
+        r -= alpha*Ap
+        z = r / diagonal[:,None]
+
+        rzNew = np.sum(r*z, axis=0)
+        beta = np.zeros_like(rz)
+        np.divide(rzNew, rz, out=beta, where=~done)
+
+        p = z + beta*p
+        rz = rzNew
+
+    raise RuntimeError("The conjugate gradient method did not converge in "
+                       f"{maxiter} iterations.")
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Checks that the batched element routines match calfem.core within round-off
+on random triangle and quad elements, e.g.
+
+    >>python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+import calfem.core as cfc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import elements as elm
+
+NEL = 50
+EP = [1, 0.1]
+D = cfc.hooke(1, 210e9, 0.3)
+
+#Reference elements that are perturbed to random convex elements.
+CORNERS = {3: np.array([[0.0, 0.0], [1.0, 0.0], [0.3, 0.9]]),
+           4: np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])}
+
+def randomElements(nen, seed=0):
+    """
+    Function to make random elements with nen nodes, scaled, rotated and
+    moved from the reference element with the nodes slightly moved.
+
+    """
+    rng = np.random.default_rng(seed)
+
+    nodes = CORNERS[nen] + rng.uniform(-0.15, 0.15, (NEL, nen, 2))
+    angle = rng.uniform(0, 2*np.pi, NEL)
+    rotation = np.stack([np.stack([np.cos(angle), -np.sin(angle)], -1),
+                         np.stack([np.sin(angle), np.cos(angle)], -1)], -2)
+    nodes = np.einsum("eij,enj->eni", rotation, nodes)
+    nodes = nodes*rng.uniform(0.01, 2.0, (NEL, 1, 1)) + \
+            rng.uniform(-5, 5, (NEL, 1, 2))
+
+    ed = rng.normal(scale=1e-3, size=(NEL, 2*nen))
+
+    return nodes[:,:,0], nodes[:,:,1], ed
+
+def assertClose(actual, expected):
+    scale = np.abs(expected).max()
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12*scale)
+
+@pytest.mark.parametrize("nen, batch, single", [
+    (3, elm.planteBatch, cfc.plante),
+    (4, elm.planqeBatch, cfc.planqe)])
+def test_stiffness(nen, batch, single):
+    ex, ey, _ = randomElements(nen)
+
+    Kes = batch(ex, ey, EP, D)
+
+    for i in range(NEL):
+        assertClose(Kes[i], np.asarray(single(ex[i], ey[i], EP, D)))
+
+@pytest.mark.parametrize("nen, batch, single", [
+    (3, elm.plantsBatch, cfc.plants),
+    (4, elm.planqsBatch, cfc.planqs)])
+def test_stresses(nen, batch, single):
+    ex, ey, ed = randomElements(nen)
+
+    es, et = batch(ex, ey, EP, D, ed)
+
+    for i in range(NEL):
+        esi, eti = single(ex[i], ey[i], EP, D, ed[i])
+        assertClose(es[i], np.ravel(esi))
+        assertClose(et[i], np.ravel(eti))
+
+def test_coordxtr():
+    nx, ny = 6, 4
+    x, y = np.meshgrid(np.arange(nx, dtype=float), np.arange(ny, dtype=float))
+    coords = np.column_stack([x.ravel(), y.ravel()])
+    dofs = np.arange(1, 2*coords.shape[0]+1).reshape(-1, 2)
+
+    #Quads of a structured grid, numbered against the node order.
+    nodes = np.arange(nx*ny).reshape(ny, nx)
+    topo = np.column_stack([nodes[:-1,:-1].ravel(), nodes[:-1,1:].ravel(),
+                            nodes[1:,1:].ravel(), nodes[1:,:-1].ravel()])
+    edof = dofs[topo[::-1]].reshape(topo.shape[0], -1)
+
+    ex, ey = elm.coordxtrBatch(edof, coords, dofs)
+    exr, eyr = cfc.coordxtr(edof, coords, dofs)
+
+    np.testing.assert_array_equal(ex, exr)
+    np.testing.assert_array_equal(ey, eyr)
+
+def test_stress2nodal():
+    rng = np.random.default_rng(1)
+    dofs = np.arange(1, 41).reshape(-1, 2)
+    topo = np.array([rng.choice(20, 3, replace=False) for _ in range(15)])
+    edof = dofs[topo].reshape(15, 6)
+    eseff = rng.uniform(0, 1e8, 15)
+
+    assertClose(elm.stress2nodalBatch(eseff, edof),
+                np.asarray(cfc.stress2nodal(eseff, edof)))
+
+def test_stressMeasures():
+    rng = np.random.default_rng(2)
+    es = rng.normal(scale=1e8, size=(NEL, 3))
+
+    mises, stress1, stress2 = elm.stressMeasures(es)
+
+    assertClose(mises, np.ravel(cfc.effmises(es, 1)))
+
+    #Principal stress vectors are eigenvectors of the stress tensor scaled
+    #by their eigenvalue, the largest for stress 1.
+    tensor = np.stack([np.stack([es[:,0], es[:,2]], -1),
+                       np.stack([es[:,2], es[:,1]], -1)], -2)
+    sigma = np.linalg.eigvalsh(tensor)
+
+    for principal, eig in ((stress1, sigma[:,1]), (stress2, sigma[:,0])):
+        np.testing.assert_array_equal(principal[:,2], 0.0)
+        assertClose(np.einsum("ei,ei->e", principal, principal), eig**2)
+        assertClose(np.einsum("eij,ej->ei", tensor, principal[:,:2]),
+                    eig[:,None]*principal[:,:2])
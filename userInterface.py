@@ -6,13 +6,15 @@ Created on Sat May  2 13:57:35 2020
 @email: p.nordq@gmail.com
 """
 
-from PyQt5.QtCore import QThread
-from PyQt5.QtWidgets import QMainWindow, QFileDialog, QMessageBox
+from PyQt5.QtCore import QThread, pyqtSignal, Qt, QAbstractTableModel
+from PyQt5.QtWidgets import (QMainWindow, QFileDialog, QMessageBox, QAction,
+                             QProgressBar, QPushButton)
 from PyQt5.uic import loadUi
 from PyQt5.QtGui import QFont, QIcon
 
-from dataTypes import InputData, OutputData
-from solvers import Solver
+import os
+
+from dataTypes import InputData, OutputData, resultsFilename
 from resultUtilities import Report, Visualization
 
 import numpy as np
@@ -58,6 +60,28 @@ class MainWindow(QMainWindow):
         self.ui.executePushButton.clicked.connect(self.onActionExecute)
         self.ui.undisplacedBox.stateChanged.connect(self.onShowUndisplacedMesh)
 
+        #--Progress and cancellation of parameter studies in the status bar.
+        self.actionCancel = QAction("Cancel parameter study", self)
+        self.actionCancel.setShortcut("Esc")
+        self.actionCancel.setEnabled(False)
+        self.actionCancel.triggered.connect(self.onActionCancel)
+        self.ui.menuCalc.addAction(self.actionCancel)
+
+        #--Opt-in profiling of the solver stages, shown in the report.
+        self.actionProfile = QAction("Profile solver stages", self)
+        self.actionProfile.setCheckable(True)
+        self.ui.menuCalc.addAction(self.actionProfile)
+
+        self.progressBar = QProgressBar()
+        self.progressBar.setFormat("%v/%m steps")
+        self.progressBar.setVisible(False)
+        self.ui.statusbar.addPermanentWidget(self.progressBar)
+
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.setVisible(False)
+        self.cancelButton.clicked.connect(self.onActionCancel)
+        self.ui.statusbar.addPermanentWidget(self.cancelButton)
+
         #Sets set shortcuts commandos
         self.ui.actionExecute.setShortcut("Ctrl+R")
         self.ui.actionExit.setShortcut("Alt+F4")
@@ -82,6 +106,10 @@ class MainWindow(QMainWindow):
 
         #Sets font and size in the repport window.
         self.ui.reportEdit.setFont(QFont('Courier New',10))
+        self.ui.tableView.setFont(QFont('Courier New',10))
+
+        #Shows the chosen table of the report.
+        self.ui.tableBox.currentIndexChanged.connect(self.onShowTable)
 
         #--Sets the following windows to be read only.
         self.ui.reportEdit.setReadOnly(True)
@@ -112,7 +140,9 @@ class MainWindow(QMainWindow):
 
             self.ui.setEnabled(False) #Disables GUI during execution.
 
-            self.solver = Solver(self.InputData, self.OutputData)
+            from solvers import Solver #Loaded on first use for fast startup.
+            self.solver = Solver(self.InputData, self.OutputData,
+                                 profile=self.actionProfile.isChecked())
 
             #Moves over computation to a thread so the GUI won't freeze.
             self.solverThread = SolverThread(self.solver)
@@ -124,7 +154,19 @@ class MainWindow(QMainWindow):
     def onSolverFinished(self):
         """
         Method to start when an execution thread has enden. Also print the
-        report.
+        report and saves the results next to the model file.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.showResults()
+        self.saveResults()
+
+    def showResults(self):
+        """
+        Method to enable the plots and print the report of the output data.
 
         Returns
         -------
@@ -138,10 +180,104 @@ class MainWindow(QMainWindow):
         self.ui.setEnabled(True) #Makes GUI interactible.
 
         # --- Generate the end repport.
-        self.ui.reportEdit.clear() #Cleares previous text.
+        self.clearReport() #Cleares previous text.
         self.report = Report(self.InputData, self.OutputData)
         np.set_printoptions(formatter={'float': '{: 0.3f}'.format})
-        self.ui.reportEdit.setPlainText(str(self.report))
+        self.ui.reportEdit.setPlainText(self.report.summary())
+
+        #The tables are only read from the output data when shown.
+        self.ui.tableBox.blockSignals(True)
+        self.ui.tableBox.addItems([table[0] for table in Report.TABLES])
+        self.ui.tableBox.blockSignals(False)
+        self.onShowTable(self.ui.tableBox.currentIndex())
+
+    def saveResults(self):
+        """
+        Method to save the results next to the model file, so they can be
+        opened without solving again. Only results of the current input of a
+        saved model are saved.
+
+        Returns
+        -------
+        None.
+
+        """
+        if (self.filename != "" and self.calcDone and
+            self.OutputData.inputKey == self.InputData.key()):
+            self.OutputData.save(resultsFilename(self.filename),
+                                 compress=False)
+
+    def openResults(self):
+        """
+        Method to offer opening saved results of the model instead of solving
+        it again. Results saved for another input are ignored.
+
+        Returns
+        -------
+        TYPE(opened): : bool
+            DESCRIPTION. True if the results were opened.
+
+        """
+        filename = resultsFilename(self.filename)
+        if not os.path.exists(filename):
+            return False
+
+        results = OutputData()
+        try:
+            results.load(filename)
+        except (OSError, ValueError, KeyError):
+            return False
+
+        if results.inputKey != self.InputData.key():
+            return False
+
+        message = ("Saved results were found for this model.\n Do you want to"
+                   " open them instead of solving the model again?")
+        answer = QMessageBox.question(self, "Open results", message)
+        del message
+        if answer != QMessageBox.Yes:
+            return False
+
+        #Updated in place since the solver refers to the output data. The
+        #results of a half model are mirrored, so they have the full outline.
+        results.geometry = self.InputData.geometry(half=False)
+        self.OutputData.update(results)
+        self.showResults()
+
+        return True
+
+    def onShowTable(self, index):
+        """
+        Method to show a table of the report. It is triggered when a table is
+        chosen in the GUI.
+
+        Parameters
+        ----------
+        TYPE(index): : int
+            DESCRIPTION. Index of the table in Report.TABLES, -1 if none.
+
+        Returns
+        -------
+        None.
+
+        """
+        if index < 0:
+            return
+
+        self.ui.tableView.setModel(ArrayTableModel(*self.report.table(index)))
+
+    def clearReport(self):
+        """
+        Method to clear the report summary and tables in the GUI.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.ui.reportEdit.clear()
+        self.ui.tableBox.clear()
+        self.ui.tableView.setModel(None)
 
     def initModel(self):
         """
@@ -166,7 +302,8 @@ class MainWindow(QMainWindow):
             'text_input': False
             }
         self.updateButtons()
-        self.solver = Solver(self.InputData,self.OutputData)
+        self.solver = None #Made on execution to defer loading the solvers.
+        self.solverThread = None
         self.Visual.drawUndisplaced = False #Default to not show the org mesh.
         self.ui.undisplacedBox.setChecked(False) #Sets default to not checked.
         self.ui.undisplacedBox.setEnabled(False)
@@ -351,16 +488,26 @@ class MainWindow(QMainWindow):
         #Catches if no filname has been given.
         if self.filename !="":
             self.Visual.closeAll() #Closses all windows.
-            self.InputData.load(self.filename)
+
+            #Catches models with an invalid refinement of the notch corners.
+            try:
+                self.InputData.load(self.filename)
+            except ValueError as err:
+                QMessageBox.critical(self, "Invalid model", str(err))
+                self.onActionNew() #The partly loaded model is discarded.
+                return
+
             self.updateControls()
             self.calcDone = False
             self.updateButtons()
-            self.ui.reportEdit.clear() #Cleares repport on new model.
+            self.clearReport() #Cleares repport on new model.
             message = ("The model was succesfully succesfully loaded from the"
             f" file {self.filename}!")
             QMessageBox.information(self,'Message', message)
             del message
 
+            self.openResults()
+
     def onActionSave(self):
         """
         Method to save the modell. Before it saves the model, it updates it with
@@ -384,6 +531,7 @@ class MainWindow(QMainWindow):
             if self.filename !="":
                 self.updateModel()
                 self.InputData.save(self.filename)
+                self.saveResults()
                 message = f"The model was  saved in the file {self.filename}!"
                 QMessageBox.information(self,'Message', message)
                 del message
@@ -417,6 +565,7 @@ class MainWindow(QMainWindow):
                 self.filename = newFilename
                 self.updateModel()
                 self.InputData.save(self.filename)
+                self.saveResults()
 
                 message = f"The model was saved in the file {self.filename}!"
                 QMessageBox.information(self,"Message", message)
@@ -440,7 +589,7 @@ class MainWindow(QMainWindow):
         self.Visual.closeAll()
         self.initModel() #Load defaults.
         self.updateControls()
-        self.ui.reportEdit.clear() #Cleares repport on new model.
+        self.clearReport() #Cleares repport on new model.
 
     def onActionExit(self):
         """
@@ -585,15 +734,107 @@ class MainWindow(QMainWindow):
 
             self.InputData.paramFilename = "paramStudy"
             self.InputData.paramSteps = int(self.ui.paramstudyBox.value())
-
+            self.studyFilename = filename
+
+            if self.solver is None:
+                from solvers import Solver
+                self.solver = Solver(self.InputData, self.OutputData)
+            self.solver.profile = self.actionProfile.isChecked()
+
+            #Only the inputs are disabled, so the study can be cancelled.
+            self.ui.centralwidget.setEnabled(False)
+            self.ui.menuFile.setEnabled(False)
+            self.ui.actionExecute.setEnabled(False)
+            self.actionCancel.setEnabled(True)
+
+            self.progressBar.setRange(0, self.InputData.paramSteps)
+            self.progressBar.setValue(0)
+            self.progressBar.setVisible(True)
+            self.cancelButton.setEnabled(True)
+            self.cancelButton.setVisible(True)
+            self.ui.statusbar.showMessage("Solving the model...")
+
+            #Runs the study in the background, steps are reported as they
+            #are exported.
             self.solverThread = SolverThread(self.solver, paramStudy = True)
-            self.solverThread.finished.connect(self.onSolverFinished)
-            self.solverThread.run()
+            self.solverThread.frameFinished.connect(self.onFrameFinished)
+            self.solverThread.finished.connect(self.onParamStudyFinished)
+            self.solverThread.start()
+
+    def onFrameFinished(self, step, steps, filename):
+        """
+        Method to show the progress of a parameter study. It is triggered by
+        the solver thread when a step is exported.
+
+        Parameters
+        ----------
+        TYPE(step): : int
+            DESCRIPTION. Number of finished steps.
+        TYPE(steps): : int
+            DESCRIPTION. Number of steps in the study.
+        TYPE(filename): : str
+            DESCRIPTION. Name of the exported file.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.progressBar.setRange(0, steps)
+        self.progressBar.setValue(step)
+        self.ui.statusbar.showMessage(f"Step {step} of {steps} saved to "
+                                      f"{filename}")
+
+    def onActionCancel(self):
+        """
+        Method to cancel a running parameter study. The step in progress is
+        finished before the study stops.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.solverThread is not None and self.solverThread.isRunning():
+            self.solverThread.cancel()
+            self.cancelButton.setEnabled(False)
+            self.ui.statusbar.showMessage("Cancelling after the current "
+                                          "step...")
 
+    def onParamStudyFinished(self):
+        """
+        Method to start when a parameter study thread has ended. Restores the
+        GUI, reports how the study ended and shows the report of the last
+        step.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.ui.centralwidget.setEnabled(True)
+        self.ui.menuFile.setEnabled(True)
+        self.ui.actionExecute.setEnabled(True)
+        self.actionCancel.setEnabled(False)
+        self.progressBar.setVisible(False)
+        self.cancelButton.setVisible(False)
+        self.ui.statusbar.clearMessage()
+
+        #One frame is recorded per finished step, also when an xdmf study
+        #writes all steps to the same file.
+        steps = len(self.solver.frames)
+        if self.solver.cancelled:
+            message = (f"The parameter study was cancelled after {steps} of "
+                       f"{self.InputData.paramSteps} steps!\n The finished "
+                       f"steps are saved in the files which start with "
+                       f"{self.studyFilename} !")
+        else:
             message = ("The paramater study was succesfull!\n It is saved in"
-                      f"the .vtk which starts with {filename} !")
-            QMessageBox.information(self,'Message', message)
-            del message
+                      f" the files which start with {self.studyFilename} !")
+        QMessageBox.information(self,'Message', message)
+        del message
+
+        self.showResults()
 
     def onEltype2(self):
         """
@@ -619,11 +860,111 @@ class MainWindow(QMainWindow):
         """
         self.InputData.el_type = 3
 
+class ArrayTableModel(QAbstractTableModel):
+    """
+    Class to show a table of the report in a table view. The cells are
+    formatted from the array when the view asks for them, so only the
+    visible rows are formatted regardless of the size of the table.
+    """
+
+    def __init__(self, title, values, headers, scale=1, integer=False):
+        """
+        Constructor for the table model.
+
+        Parameters
+        ----------
+        TYPE(title): : str
+            DESCRIPTION. The title of the table.
+        TYPE(values): : numpy.ndarray
+            DESCRIPTION. The unscaled values, shape (nrow, ncol).
+        TYPE(headers): : list
+            DESCRIPTION. The column names, empty to number the columns.
+        TYPE(scale): : float, optional
+            DESCRIPTION. Factor to multiply the values with. The default is 1.
+        TYPE(integer): : bool, optional
+            DESCRIPTION. Boolean to show the values as integers. The default
+            is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        QAbstractTableModel.__init__(self)
+        self.title = title
+        self.values = values
+        self.headers = headers
+        self.scale = scale
+        self.integer = integer
+
+    def rowCount(self, parent=None):
+        """
+        Method to get the number of rows of the table.
+
+        Returns
+        -------
+        TYPE(rows): : int
+            DESCRIPTION. The number of rows.
+
+        """
+        return self.values.shape[0]
+
+    def columnCount(self, parent=None):
+        """
+        Method to get the number of columns of the table.
+
+        Returns
+        -------
+        TYPE(columns): : int
+            DESCRIPTION. The number of columns.
+
+        """
+        return self.values.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        """
+        Method to get the text of a cell.
+
+        Returns
+        -------
+        TYPE(text): : str or None
+            DESCRIPTION. The formatted value, None for other roles.
+
+        """
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+
+        value = self.values[index.row(), index.column()]
+        if self.integer:
+            return str(int(value))
+        return f"{value*self.scale:.3f}"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        """
+        Method to get the column names and the row numbers.
+
+        Returns
+        -------
+        TYPE(text): : str or None
+            DESCRIPTION. The header text, None for other roles.
+
+        """
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal and self.headers:
+            return self.headers[section]
+        return str(section + 1)
+
 class SolverThread(QThread):
     """
     Class to handle execution threads i.e solverthreads.
     """
 
+    #Emitted as (step, steps, filename) when a parameter study step is saved.
+    frameFinished = pyqtSignal(int, int, str)
+
     def __init__(self, solver, paramStudy=False):
         """
         Constructor for the solver thread.
@@ -645,6 +986,9 @@ class SolverThread(QThread):
         self.solver = solver
         self.paramStudy = paramStudy
 
+        if paramStudy:
+            self.solver.progress = self.frameFinished.emit
+
     def __del__(self):
         """
         Method to delete the thread.
@@ -666,6 +1010,21 @@ class SolverThread(QThread):
         None.
 
         """
+        self.solver.cancelled = False
+        self.solver.frames = []
+        self.solver.clearProfile()
         self.solver.execute()
-        if self.paramStudy:
+        if self.paramStudy and not self.solver.cancelled:
             self.solver.executeParamStudy()
+
+    def cancel(self):
+        """
+        Method to cancel the parameter study of the thread after the step in
+        progress.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.solver.cancel()
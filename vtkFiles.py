@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Writers for VTK XML and XDMF files. Arrays are written straight from NumPy
+buffers as raw binary data, which is much smaller and faster than the legacy
+ascii format.
+"""
+import os
+import zlib
+
+import numpy as np
+
+#VTK cell types for the element types of the GMSH mesh generator.
+VTK_CELL_TYPES = {2: 5, 3: 9} #2: triangles, 3: quads
+
+#Uncompressed size of the zlib blocks.
+BLOCK_SIZE = 2**16
+
+#VTK XML type names for NumPy dtypes.
+VTK_TYPES = {np.dtype(np.float64): "Float64",
+             np.dtype(np.float32): "Float32",
+             np.dtype(np.int64): "Int64",
+             np.dtype(np.int32): "Int32",
+             np.dtype(np.uint8): "UInt8"}
+
+def encodeArray(array, compress=True):
+    """
+    Function to encode an array as a block of VTK XML appended data with an
+    UInt64 header.
+
+    Parameters
+    ----------
+    TYPE(array): : numpy.ndarray
+        DESCRIPTION. The array to encode.
+    TYPE(compress): : bool, optional
+        DESCRIPTION. Boolean to controll zlib compression. The default is True.
+
+    Returns
+    -------
+    TYPE(block): : bytes
+        DESCRIPTION. The header followed by the (compressed) data.
+
+    """
+    data = np.ascontiguousarray(array).tobytes()
+
+    if not compress:
+        return np.array([len(data)], dtype="<u8").tobytes() + data
+
+    blocks = [zlib.compress(data[i:i+BLOCK_SIZE])
+              for i in range(0, max(len(data), 1), BLOCK_SIZE)]
+    last = len(data) - (len(blocks)-1)*BLOCK_SIZE
+
+    header = [len(blocks), BLOCK_SIZE, last] + [len(b) for b in blocks]
+
+    return np.array(header, dtype="<u8").tobytes() + b"".join(blocks)
+
+def writeVtu(filename, points, topo, el_type, point_data=None,
+             cell_data=None, compress=True):
+    """
+    Function to write a mesh with point and cell data to a VTK XML
+    unstructured grid (.vtu) file with appended binary data.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. Name of the .vtu file.
+    TYPE(points): : numpy.ndarray
+        DESCRIPTION. Node coordinates, shape (nnode, 2) or (nnode, 3).
+    TYPE(topo): : numpy.ndarray
+        DESCRIPTION. Element node topology with 1-based nodes, shape
+        (nel, nen).
+    TYPE(el_type): : int
+        DESCRIPTION. Element type, 2: triangles, 3: quads.
+    TYPE(point_data): : dict, optional
+        DESCRIPTION. Arrays with one row per node, by name. The default is
+        None.
+    TYPE(cell_data): : dict, optional
+        DESCRIPTION. Arrays with one row per element, by name. The default is
+        None.
+    TYPE(compress): : bool, optional
+        DESCRIPTION. Boolean to controll zlib compression. The default is True.
+
+    Returns
+    -------
+    None.
+
+    """
+    point_data = point_data or {}
+    cell_data = cell_data or {}
+
+    points = np.asarray(points, dtype=np.float64)
+    if points.shape[1] == 2:
+        points = np.column_stack([points, np.zeros(points.shape[0])])
+
+    topo = np.asarray(topo, dtype=np.int64)
+    nel, nen = topo.shape
+
+    connectivity = topo.ravel() - 1
+    offsets = np.arange(1, nel+1, dtype=np.int64)*nen
+    types = np.full(nel, VTK_CELL_TYPES[el_type], dtype=np.uint8)
+
+    blocks = []
+    offset = [0]
+
+    def dataArray(name, array):
+        """Appends an array and returns its DataArray tag."""
+        array = np.asarray(array)
+        if array.dtype not in VTK_TYPES:
+            array = array.astype(np.float64)
+        block = encodeArray(array, compress)
+        components = 1 if array.ndim == 1 else array.shape[1]
+        tag = (f'<DataArray type="{VTK_TYPES[array.dtype]}" Name="{name}" '
+               f'NumberOfComponents="{components}" format="appended" '
+               f'offset="{offset[0]}"/>')
+        blocks.append(block)
+        offset[0] += len(block)
+        return tag
+
+    lines = ['<?xml version="1.0"?>']
+    compressor = ' compressor="vtkZLibDataCompressor"' if compress else ''
+    lines.append('<VTKFile type="UnstructuredGrid" version="1.0" '
+                 'byte_order="LittleEndian" header_type="UInt64"'
+                 f'{compressor}>')
+    lines.append('<UnstructuredGrid>')
+    lines.append(f'<Piece NumberOfPoints="{points.shape[0]}" '
+                 f'NumberOfCells="{nel}">')
+
+    lines.append('<PointData>')
+    lines += [dataArray(name, array) for name, array in point_data.items()]
+    lines.append('</PointData>')
+
+    lines.append('<CellData>')
+    lines += [dataArray(name, array) for name, array in cell_data.items()]
+    lines.append('</CellData>')
+
+    lines.append('<Points>')
+    lines.append(dataArray("Points", points))
+    lines.append('</Points>')
+
+    lines.append('<Cells>')
+    lines.append(dataArray("connectivity", connectivity))
+    lines.append(dataArray("offsets", offsets))
+    lines.append(dataArray("types", types))
+    lines.append('</Cells>')
+
+    lines.append('</Piece>')
+    lines.append('</UnstructuredGrid>')
+    lines.append('<AppendedData encoding="raw">')
+
+    with open(filename, "wb") as ofile:
+        ofile.write(("\n".join(lines) + "\n_").encode("ascii"))
+        for block in blocks:
+            ofile.write(block)
+        ofile.write(b"\n</AppendedData>\n</VTKFile>\n")
+
+def writePvd(filename, frames):
+    """
+    Function to write a ParaView collection (.pvd) file indexing the frames
+    of a parameter study. The frames are referenced relative to the
+    collection file and get their index as time step.
+
+    Parameters
+    ----------
+    TYPE(filename): : str
+        DESCRIPTION. Name of the .pvd file.
+    TYPE(frames): : list
+        DESCRIPTION. File names of the frames in order.
+
+    Returns
+    -------
+    None.
+
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+
+    lines = ['<?xml version="1.0"?>',
+             '<VTKFile type="Collection" version="0.1" '
+             'byte_order="LittleEndian">',
+             '<Collection>']
+    for step, frame in enumerate(frames):
+        relative = os.path.relpath(os.path.abspath(frame), folder)
+        lines.append(f'<DataSet timestep="{step}" group="" part="0" '
+                     f'file="{relative}"/>')
+    lines.append('</Collection>')
+    lines.append('</VTKFile>')
+
+    with open(filename, "w") as ofile:
+        ofile.write("\n".join(lines) + "\n")
+
+class XdmfSeries():
+    """
+    Class to write a time series on a fixed mesh as an XDMF file for
+    ParaView. The mesh is stored once and every step only appends its point
+    and cell data, all in one raw binary file next to the .xdmf file.
+    """
+
+    #XDMF topology names for the element types of the GMSH mesh generator.
+    TOPOLOGY_TYPES = {2: "Triangle", 3: "Quadrilateral"}
+
+    def __init__(self, filename, points, topo, el_type):
+        """
+        Constructor for the series. Writes the mesh to the binary file.
+
+        Parameters
+        ----------
+        TYPE(filename): : str
+            DESCRIPTION. Name of the .xdmf file, the binary data is written
+            to the same name with a .bin extension.
+        TYPE(points): : numpy.ndarray
+            DESCRIPTION. Node coordinates, shape (nnode, 2).
+        TYPE(topo): : numpy.ndarray
+            DESCRIPTION. Element node topology with 1-based nodes, shape
+            (nel, nen).
+        TYPE(el_type): : int
+            DESCRIPTION. Element type, 2: triangles, 3: quads.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.filename = filename
+        self.binFilename = os.path.splitext(filename)[0] + ".bin"
+        self.steps = []
+
+        self.binFile = open(self.binFilename, "wb")
+
+        topo = np.asarray(topo, dtype=np.int64)
+        self.nel = topo.shape[0]
+        self.el_type = el_type
+
+        self.geometry = self.__append(np.asarray(points, dtype=np.float64)[:,:2])
+        self.topology = self.__append(topo - 1)
+
+    def __append(self, array):
+        """
+        Helpmethod to append an array to the binary file.
+
+        Parameters
+        ----------
+        TYPE(array): : numpy.ndarray
+            DESCRIPTION. The array to append.
+
+        Returns
+        -------
+        TYPE(item): : str
+            DESCRIPTION. An XDMF DataItem referencing the array.
+
+        """
+        array = np.ascontiguousarray(array)
+        if array.dtype.kind == "f":
+            array = array.astype("<f8")
+            numberType = "Float"
+        else:
+            array = array.astype("<i8")
+            numberType = "Int"
+
+        seek = self.binFile.tell()
+        self.binFile.write(array.tobytes())
+
+        dimensions = " ".join(str(n) for n in array.shape)
+        return (f'<DataItem Dimensions="{dimensions}" NumberType="{numberType}"'
+                f' Precision="8" Format="Binary" Endian="Little" '
+                f'Seek="{seek}">{os.path.basename(self.binFilename)}'
+                '</DataItem>')
+
+    def addStep(self, time, point_data=None, cell_data=None):
+        """
+        Method to append the data of one step of the series.
+
+        Parameters
+        ----------
+        TYPE(time): : float
+            DESCRIPTION. Time value of the step.
+        TYPE(point_data): : dict, optional
+            DESCRIPTION. Arrays with one row per node, by name. The default
+            is None.
+        TYPE(cell_data): : dict, optional
+            DESCRIPTION. Arrays with one row per element, by name. The
+            default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+        attributes = []
+        for center, data in (("Node", point_data or {}),
+                             ("Cell", cell_data or {})):
+            for name, array in data.items():
+                array = np.asarray(array, dtype=np.float64)
+                kind = "Scalar" if array.ndim == 1 else "Vector"
+                attributes.append(f'<Attribute Name="{name}" '
+                                  f'AttributeType="{kind}" '
+                                  f'Center="{center}">'
+                                  f'{self.__append(array)}</Attribute>')
+
+        self.steps.append((time, attributes))
+
+    def close(self):
+        """
+        Method to close the binary file and write the .xdmf file indexing
+        all steps.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.binFile.close()
+
+        name = os.path.splitext(os.path.basename(self.filename))[0]
+        topologyType = self.TOPOLOGY_TYPES[self.el_type]
+
+        lines = ['<?xml version="1.0" ?>',
+                 '<Xdmf Version="3.0">',
+                 '<Domain>',
+                 f'<Grid Name="{name}" GridType="Collection" '
+                 'CollectionType="Temporal">']
+        for step, (time, attributes) in enumerate(self.steps):
+            lines.append(f'<Grid Name="{name}_{step+1:02d}" '
+                         'GridType="Uniform">')
+            lines.append(f'<Time Value="{time}"/>')
+            lines.append(f'<Topology TopologyType="{topologyType}" '
+                         f'NumberOfElements="{self.nel}">'
+                         f'{self.topology}</Topology>')
+            lines.append(f'<Geometry GeometryType="XY">{self.geometry}'
+                         '</Geometry>')
+            lines += attributes
+            lines.append('</Grid>')
+        lines += ['</Grid>', '</Domain>', '</Xdmf>']
+
+        with open(self.filename, "w") as ofile:
+            ofile.write("\n".join(lines) + "\n")